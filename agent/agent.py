@@ -8,30 +8,37 @@ import os
 # Variables et données
 import json
 from typing import TypedDict, List, Annotated, Any
-import pandas as pd
-from io import StringIO
 import textwrap
 
-# Graphiques
-import plotly.express as px
-import plotly.io as pio
-import plotly.graph_objects as go
-import graphviz
-
 # Numéro de session unique
 import uuid
+import hashlib
+import threading
+import shutil
+
+# Exécution parallèle des outils
+from concurrent.futures import ThreadPoolExecutor
 
 # Import de scripts
 from src.fetch_data import APILimitError 
 from src.chart_theme import stella_theme 
+from src.cache import CACHE_DIR
+from src.downsample import downsample_frame, chart_render_mode
+from src.figure_codec import encode_figure
+from src.metrics import start_metrics_logger
+from artifacts import artifact_store, describe_frame
+from checkpointer import BoundedSqliteSaver
+from llm_cache import llm_cache, LLM_CACHE_ENABLED
+from tracing import trace_store
+from history import apply_history_policy, stub_tool_outputs, build_summary_prompt, summary_message, estimate_tokens, HISTORY_SUMMARY_ENABLED
 
 # LangGraph et LangChain
-from langchain_groq import ChatGroq
+# Les dépendances lourdes et rarement utilisées (plotly, graphviz, langsmith, langchain_groq) sont
+# importées à la première utilisation, pour accélérer le démarrage de l'application.
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import AnyMessage, add_messages
-from langgraph.checkpoint.memory import MemorySaver
-from langsmith import Client
 
 
 # --- Import des tools ---
@@ -60,12 +67,31 @@ LANGSMITH_PROJECT = "stella"
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY n'a pas été enregistrée comme variable d'environnement.")
 
-# Initialize the LLM
-llm = ChatGroq(
-    model=GROQ_MODEL,
-    api_key=GROQ_API_KEY,
-    temperature=0
-)
+# Initialize the LLM (à la première utilisation)
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Renvoie le client LLM partagé, créé au premier appel."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_groq import ChatGroq
+                # Température 0 : réponses déterministes, mises en cache pour ne pas payer deux fois le même appel
+                _llm = ChatGroq(
+                    model=GROQ_MODEL,
+                    api_key=GROQ_API_KEY,
+                    temperature=0,
+                    cache=llm_cache if LLM_CACHE_ENABLED else False
+                )
+    return _llm
+
+# Streaming token par token vers l'UI : seuls les noeuds qui rédigent une réponse destinée à
+# l'utilisateur sont affichés. Un appel LLM interne (résumé, reformulation...) doit porter le tag
+# INTERNAL_LLM_TAG, ex: get_llm().with_config(tags=[INTERNAL_LLM_TAG]), pour ne pas apparaître dans le chat.
+STREAMED_NODES = ("agent", "prepare_profile_display")
+INTERNAL_LLM_TAG = "stella_internal"
 
 # Objet AgentState pour stocker et modifier l'état de l'agent entre les nœuds
 class AgentState(TypedDict):
@@ -73,12 +99,18 @@ class AgentState(TypedDict):
     ticker: str
     tickers: List[str]
     company_name: str
-    fetched_df_json: str
-    processed_df_json: str
+    # Les DataFrames vivent dans l'artifact_store : l'état ne garde que leur handle et leur schéma
+    fetched_df_ref: str
+    fetched_df_schema: dict
+    processed_df_ref: str
+    processed_df_schema: dict
     analysis: str
     plotly_json: str  
     messages: Annotated[List[AnyMessage], add_messages]
     error: str
+    # Mémoire glissante des tours les plus anciens, et id du dernier message qu'elle couvre
+    history_summary: str
+    history_summary_upto: str
 
 # --- Prompt système (définition du rôle de l'agent) ---
 system_prompt = """Ton nom est Stella. Tu es une assistante experte financière. Ton but principal est d'aider les utilisateurs en analysant des actions.
@@ -113,17 +145,17 @@ Tu dois impérativement comprendre et respecter ces deux règles :
 9.  `get_stock_news`: Récupère les dernières actualités. **Fonctionne mieux pour les entreprises internationales.**
 10. `get_company_profile`: Récupère le profil d'une entreprise. **Fonctionne pour les entreprises internationales.**
 11. `compare_stocks`: Compare plusieurs entreprises sur une métrique financière ou sur leur prix. **Lis attentivement les instructions ci-dessous pour cet outil.**
+12. `full_analysis`: Lance l'analyse complète d'une action (recherche du ticker, données, prétraitement et risques) en un seul appel. **RAPPEL : Ne fonctionne que pour les actions américaines.**
 
 Si l'utilisateur te demande comment tu fonctionnes, à quoi tu sers, ou toute autre demande similaire tu n'utiliseras pas d'outils. 
 Tu expliqueras simplement ton rôle et tes fonctionnalités en donnant des exemples de demandes qu'on peut te faire.
 
 **Séquence d'analyse complète (Actions Américaines Uniquement)**
-Quand un utilisateur te demande une analyse complète, tu DOIS suivre cette séquence d'outils :
-1.  `search_ticker` si le nom de l'entreprise est donné plutôt que le ticker.
-2.  `fetch_data` avec le ticker demandé.
-3.  `preprocess_data` pour nettoyer les données.
-4.  `analyze_risks` pour obtenir un verdict.
-Ta tâche est considérée comme terminée après l'appel à `analyze_risks`. La réponse finale avec le graphique sera générée automatiquement.
+Quand un utilisateur te demande une analyse complète, tu DOIS appeler UNE SEULE FOIS l'outil `full_analysis` :
+*   avec `ticker` si le ticker est connu (ex: `full_analysis(ticker='AAPL')`) ;
+*   sinon avec `company_name` (ex: `full_analysis(company_name='Apple')`), la recherche du ticker est faite automatiquement.
+L'outil enchaîne lui-même la récupération des données, le prétraitement et l'analyse des risques.
+Ta tâche est considérée comme terminée après l'appel à `full_analysis`. La réponse finale avec le graphique sera générée automatiquement.
 
 **IDENTIFICATION DU TICKER** 
 Si l'utilisateur donne un nom de société (comme 'Apple' ou 'Microsoft') au lieu d'un ticker (comme 'AAPL' ou 'MSFT'), 
@@ -161,7 +193,7 @@ Tu dois toujours répondre en français et tutoyer ton interlocuteur.
 # --- Définition des noeuds du Graph ---
 
 # Noeud 1 : agent_node, point d'entrée et appel du LLM 
-def agent_node(state: AgentState):
+def agent_node(state: AgentState, config: RunnableConfig):
     """Le 'cerveau' de l'agent. Décide du prochain outil à appeler."""
     print("\n--- AGENT: Décision de la prochaine étape... ---")
 
@@ -170,12 +202,12 @@ def agent_node(state: AgentState):
     current_messages = [SystemMessage(content=system_prompt)]
     
     # --- INJECTION DE CONTEXTE DYNAMIQUE ---
-    data_to_inspect_json = state.get("processed_df_json") or state.get("fetched_df_json")
+    # Le schéma est mis en cache dans l'état : pas besoin de relire le DataFrame
+    data_schema = state.get("processed_df_schema") or state.get("fetched_df_schema")
     
-    if data_to_inspect_json:
+    if data_schema:
         try:
-            df = pd.read_json(StringIO(data_to_inspect_json), orient='split')
-            available_columns = df.columns.tolist()
+            available_columns = data_schema["columns"]
             
             # On crée un message système temporaire avec les colonnes disponibles
             context_message = SystemMessage(
@@ -193,191 +225,337 @@ def agent_node(state: AgentState):
         except Exception as e:
             print(f"Avertissement: Impossible d'injecter le contexte des colonnes. Erreur: {e}")
 
-    # On ajoute l'historique de la conversation depuis l'état
-    current_messages.extend(state['messages'])
+    # On ajoute l'historique de la conversation depuis l'état, fenêtré pour borner la taille du prompt
+    to_summarize, window = apply_history_policy(state['messages'])
+    updates = {}
+    if to_summarize:
+        if HISTORY_SUMMARY_ENABLED:
+            updates = _update_history_summary(state, to_summarize, config)
+        summary = updates.get("history_summary", state.get("history_summary"))
+        upto = updates.get("history_summary_upto", state.get("history_summary_upto"))
+        message_ids = [message.id for message in to_summarize]
+        pending = to_summarize[message_ids.index(upto) + 1:] if summary and upto in message_ids else to_summarize
+        if summary:
+            current_messages.append(summary_message(summary))
+        # Tours pas (encore) couverts par la mémoire : gardés, allégés de leurs résultats d'outils
+        window = stub_tool_outputs(pending) + window
+    current_messages.extend(window)
+
+    tokens_before = estimate_tokens(current_messages[:1] + state['messages'])
+    tokens_after = estimate_tokens(current_messages)
+    print(f"Historique: ~{tokens_before} -> ~{tokens_after} tokens envoyés au LLM ({len(state['messages'])} -> {len(window)} messages).")
 
     # On invoque le LLM avec la liste de messages complète
     # Cette liste est locale et ne modifie pas l'état directement
-    response = llm.bind_tools(available_tools).invoke(current_messages)
+    # La config du noeud est transmise pour que les tokens soient streamés vers l'UI (stream_mode="messages")
+    response = get_llm().bind_tools(available_tools).invoke(current_messages, config=config)
     print(f"response.content: {response.content}")
-    return {"messages": [response]}
+    return {"messages": [response], **updates}
 
-# Noeud 2 : execute_tool_node, exécute les outils en se basant sur la décision de l'agent_node (Noeud 1).
-def execute_tool_node(state: AgentState):
-    """Le "pont" qui exécute la logique réelle et met à jour l'état."""
-    print("\n--- OUTILS: Exécution d'un outil ---")
-    action_message = next((msg for msg in reversed(state['messages']) if isinstance(msg, AIMessage) and msg.tool_calls), None)
-    if not action_message:
-        raise ValueError("Aucun appel d'outil trouvé dans le dernier AIMessage.")
+def _update_history_summary(state: AgentState, to_summarize: list, config: RunnableConfig) -> dict:
+    """
+    Intègre à la mémoire glissante les messages sortis de la fenêtre depuis le dernier résumé.
+    Renvoie les mises à jour d'état (vide si la mémoire est déjà à jour ou en cas d'échec).
+    """
+    summary = state.get("history_summary") or ""
+    message_ids = [message.id for message in to_summarize]
+    upto = state.get("history_summary_upto")
+    if upto in message_ids:
+        new_messages = to_summarize[message_ids.index(upto) + 1:]
+    else:
+        new_messages, summary = to_summarize, "" # Mémoire absente ou obsolète : on la reconstruit
+    if not new_messages:
+        return {}
+
+    print(f"--- AGENT: Mise à jour de la mémoire de conversation ({len(new_messages)} messages) ---")
+    try:
+        # Appel interne : tagué pour ne pas être streamé dans le chat
+        response = get_llm().with_config(tags=[INTERNAL_LLM_TAG]).invoke(build_summary_prompt(summary, new_messages), config=config)
+    except Exception as e:
+        print(f"Avertissement: Impossible de mettre à jour la mémoire de conversation. Erreur: {e}")
+        return {}
+    return {"history_summary": response.content.strip(), "history_summary_upto": message_ids[-1]}
 
+def _run_tool_call(tool_call: dict, state: dict, session_id: str):
+    """
+    Exécute un seul appel d'outil à partir d'une vue de l'état.
+    Renvoie les ToolMessages produits et les mises à jour d'état de cet appel (sans les appliquer).
+    """
     tool_outputs = []
-    current_state_updates = {}
-    
-    # On gère le cas où plusieurs outils sont appelés, bien que ce soit rare ici.
-    for tool_call in action_message.tool_calls:
-        tool_name = tool_call['name']
-        tool_args = tool_call['args']
-        tool_id = tool_call['id']
-        print(f"Le LLM a décidé d'appeler le tool : {tool_name} - avec les arguments : {tool_args}")
+    updates = {}
+    tool_name = tool_call['name']
+    tool_args = tool_call['args']
+    tool_id = tool_call['id']
+    print(f"Le LLM a décidé d'appeler le tool : {tool_name} - avec les arguments : {tool_args}")
 
-        try:
-            if tool_name == "search_ticker":
-                company_name = tool_args.get("company_name")
+    try:
+        if tool_name == "search_ticker":
+            company_name = tool_args.get("company_name")
+            ticker = _search_ticker_logic(company_name=company_name)
+            # On stocke le ticker ET le nom de l'entreprise
+            updates["ticker"] = ticker
+            updates["company_name"] = company_name 
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=f"[Ticker `{ticker}` trouvé.]"))
+
+        elif tool_name == "fetch_data":
+            try:
+                output_df = _fetch_data_logic(ticker=tool_args.get("ticker"))
+                updates["fetched_df_ref"] = artifact_store.put(output_df, session_id)
+                updates["fetched_df_schema"] = describe_frame(output_df)
+                updates["ticker"] = tool_args.get("ticker")
+                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Données récupérées avec succès.]"))
+            except APILimitError as e:
+                user_friendly_error = "Désolé, il semble que j'aie un problème d'accès à mon fournisseur de données. Peux-tu réessayer plus tard ?"
+                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=json.dumps({"error": user_friendly_error})))
+                updates["error"] = user_friendly_error
+        
+        elif tool_name == "full_analysis":
+            # Pipeline déterministe exécuté sans repasser par le LLM entre les étapes
+            ticker = tool_args.get("ticker")
+            company_name = tool_args.get("company_name")
+            if not ticker:
+                if not company_name:
+                    raise ValueError("Il faut un ticker ou un nom d'entreprise pour lancer l'analyse complète.")
                 ticker = _search_ticker_logic(company_name=company_name)
-                # On stocke le ticker ET le nom de l'entreprise
-                current_state_updates["ticker"] = ticker
-                current_state_updates["company_name"] = company_name 
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=f"[Ticker `{ticker}` trouvé.]"))
-
-            elif tool_name == "fetch_data":
-                try:
-                    output_df = _fetch_data_logic(ticker=tool_args.get("ticker"))
-                    current_state_updates["fetched_df_json"] = output_df.to_json(orient='split')
-                    current_state_updates["ticker"] = tool_args.get("ticker")
-                    tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Données récupérées avec succès.]"))
-                except APILimitError as e:
-                    user_friendly_error = "Désolé, il semble que j'aie un problème d'accès à mon fournisseur de données. Peux-tu réessayer plus tard ?"
-                    tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=json.dumps({"error": user_friendly_error})))
-                    current_state_updates["error"] = user_friendly_error
+                updates["company_name"] = company_name
+            updates["ticker"] = ticker
+
+            try:
+                fetched_df = _fetch_data_logic(ticker=ticker)
+            except APILimitError as e:
+                user_friendly_error = "Désolé, il semble que j'aie un problème d'accès à mon fournisseur de données. Peux-tu réessayer plus tard ?"
+                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=json.dumps({"error": user_friendly_error})))
+                updates["error"] = user_friendly_error
+                return tool_outputs, updates
+            updates["fetched_df_ref"] = artifact_store.put(fetched_df, session_id)
+            updates["fetched_df_schema"] = describe_frame(fetched_df)
+
+            processed_df = _preprocess_data_logic(df=fetched_df)
+            updates["processed_df_ref"] = artifact_store.put(processed_df, session_id)
+            updates["processed_df_schema"] = describe_frame(processed_df)
+
+            output = _analyze_risks_logic(processed_data=processed_df)
+            updates["analysis"] = output
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=output))
+
+        elif tool_name == "get_stock_news":
             
-            elif tool_name == "get_stock_news":
-                
-                # 1. On cherche le ticker dans les arguments fournis par le LLM, SINON dans l'état.
-                ticker = tool_args.get("ticker") or state.get("ticker")
-                
-                # 2. Si après tout ça, on n'a toujours pas de ticker, c'est une vraie erreur.
-                if not ticker:
-                    raise ValueError("Impossible de déterminer un ticker pour chercher les nouvelles, ni dans la commande, ni dans le contexte.")
-                
-                # 3. On fait pareil pour le nom de l'entreprise (qui est optionnel mais utile)
-                # On utilise le ticker comme nom si on n'a rien d'autre.
-                company_name = tool_args.get("company_name") or state.get("company_name") or ticker
-                
-                # 4. On appelle la logique avec les bonnes informations.
-                news_summary = _fetch_recent_news_logic(
-                    ticker=ticker, 
-                    company_name=company_name
-                )
-
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=news_summary))
-                
-            elif tool_name == "preprocess_data":
-                if not state.get("fetched_df_json"):
-                    raise ValueError("Impossible de prétraiter les données car elles n'ont pas encore été récupérées.")
-                fetched_df = pd.read_json(StringIO(state["fetched_df_json"]), orient='split')
-                output = _preprocess_data_logic(df=fetched_df)
-                current_state_updates["processed_df_json"] = output.to_json(orient='split')
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Données prétraitées avec succès.]"))
-
-            elif tool_name == "analyze_risks":
-                if not state.get("processed_df_json"):
-                    raise ValueError("Impossible de faire une prédiction car les données n'ont pas encore été prétraitées.")
-                processed_df = pd.read_json(StringIO(state["processed_df_json"]), orient='split')
-                output = _analyze_risks_logic(processed_data=processed_df)
-                current_state_updates["analysis"] = output
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=output))
+            # 1. On cherche le ticker dans les arguments fournis par le LLM, SINON dans l'état.
+            ticker = tool_args.get("ticker") or state.get("ticker")
             
-            elif tool_name == "create_dynamic_chart":
-                data_json_for_chart = state.get("processed_df_json") or state.get("fetched_df_json")
-                if not data_json_for_chart:
-                    raise ValueError("Aucune donnée disponible pour créer un graphique.")
-                
-                # On convertit le JSON en DataFrame
-                df_for_chart = pd.read_json(StringIO(data_json_for_chart), orient='split')
-                
-                chart_json = _create_dynamic_chart_logic(
-                    data=df_for_chart,  # <--- Le DataFrame est passé directement
-                    chart_type=tool_args.get('chart_type'),
-                    x_column=tool_args.get('x_column'),
-                    y_column=tool_args.get('y_column'),
-                    title=tool_args.get('title'),
-                    color_column=tool_args.get('color_column')
-                )
-                
-                
-                if "Erreur" in chart_json:
-                    raise ValueError(chart_json) # Transforme l'erreur de l'outil en exception
-                
-                current_state_updates["plotly_json"] = chart_json
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique interactif créé.]"))
-
-            elif tool_name in ["display_raw_data", "display_processed_data"]:
-                if not state.get("fetched_df_json"):
-                     raise ValueError("Aucune donnée disponible à afficher.")
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Préparation de l'affichage des données.]"))
-
-            elif tool_name == "get_company_profile":
-                ticker = tool_args.get("ticker")
-                profile_json = _fetch_profile_logic(ticker=ticker)
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=profile_json))
+            # 2. Si après tout ça, on n'a toujours pas de ticker, c'est une vraie erreur.
+            if not ticker:
+                raise ValueError("Impossible de déterminer un ticker pour chercher les nouvelles, ni dans la commande, ni dans le contexte.")
             
-            elif tool_name == "display_price_chart":
-                ticker = tool_args.get("ticker")
-                period = tool_args.get("period_days", 252) # Utilise la valeur par défaut si non fournie
-                
-                # On appelle notre logique pour récupérer les données de prix
-                price_df = _fetch_price_history_logic(ticker=ticker, period_days=period)
-                
-                # On crée le graphique directement ici
-                fig = px.line(
-                    price_df, 
-                    x=price_df.index, 
-                    y='close', 
-                    title=f"Historique du cours de {ticker.upper()} sur {period} jours",
-                    color_discrete_sequence=stella_theme['colors']
+            # 3. On fait pareil pour le nom de l'entreprise (qui est optionnel mais utile)
+            # On utilise le ticker comme nom si on n'a rien d'autre.
+            company_name = tool_args.get("company_name") or state.get("company_name") or ticker
+            
+            # 4. On appelle la logique avec les bonnes informations.
+            news_summary = _fetch_recent_news_logic(
+                ticker=ticker, 
+                company_name=company_name
+            )
 
-                )
-                fig.update_layout(template=stella_theme['template'], font=stella_theme['font'], xaxis_title="Date", yaxis_title="Prix de clôture (USD)")
-                
-                # On convertit en JSON et on met à jour l'état
-                chart_json = pio.to_json(fig)
-                current_state_updates["plotly_json"] = chart_json
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique de prix créé avec succès.]"))
-
-            elif tool_name == "compare_stocks":
-                tickers = tool_args.get("tickers")
-                metric = tool_args.get("metric")
-                comparison_type = tool_args.get("comparison_type", "fundamental")
-
-                if comparison_type == 'fundamental':
-                    # On appelle la fonction qui retourne l'historique
-                    comp_df = _compare_fundamental_metrics_logic(tickers=tickers, metric=metric)
-                    fig = px.line(
-                        comp_df,
-                        x=comp_df.index,
-                        y=comp_df.columns,
-                        title=f"Évolution de la métrique '{metric.upper()}'",
-                        labels={'value': metric.upper(), 'variable': 'Ticker', 'calendarYear': 'Année'},
-                        markers=True, # Les marqueurs sont utiles pour voir les points de données annuels
-                        color_discrete_sequence=stella_theme['colors']  # Utilise la palette de couleurs Stella
-                    )
-                elif comparison_type == 'price':
-                    # La logique pour le prix ne change pas, elle est déjà une évolution
-                    period = tool_args.get("period_days", 252)
-                    comp_df = _compare_price_histories_logic(tickers=tickers, period_days=period)
-                    fig = px.line(
-                        comp_df,
-                        title=f"Comparaison de la performance des actions (Base 100)",
-                        labels={'value': 'Performance Normalisée (Base 100)', 'variable': 'Ticker', 'index': 'Date'},
-                        color_discrete_sequence=stella_theme['colors']
-                    )
-                else:
-                    raise ValueError(f"Type de comparaison inconnu: {comparison_type}")
-
-                # Le reste du code est commun et ne change pas
-                fig.update_layout(template="plotly_white")
-                chart_json = pio.to_json(fig)
-                current_state_updates["plotly_json"] = chart_json
-                current_state_updates["tickers"] = tickers
-                tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique de comparaison créé.]"))
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=news_summary))
+            
+        elif tool_name == "preprocess_data":
+            if not state.get("fetched_df_ref"):
+                raise ValueError("Impossible de prétraiter les données car elles n'ont pas encore été récupérées.")
+            fetched_df = artifact_store.get(state["fetched_df_ref"])
+            output = _preprocess_data_logic(df=fetched_df)
+            updates["processed_df_ref"] = artifact_store.put(output, session_id)
+            updates["processed_df_schema"] = describe_frame(output)
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Données prétraitées avec succès.]"))
+
+        elif tool_name == "analyze_risks":
+            if not state.get("processed_df_ref"):
+                raise ValueError("Impossible de faire une prédiction car les données n'ont pas encore été prétraitées.")
+            processed_df = artifact_store.get(state["processed_df_ref"])
+            output = _analyze_risks_logic(processed_data=processed_df)
+            updates["analysis"] = output
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=output))
+        
+        elif tool_name == "create_dynamic_chart":
+            data_ref_for_chart = state.get("processed_df_ref") or state.get("fetched_df_ref")
+            if not data_ref_for_chart:
+                raise ValueError("Aucune donnée disponible pour créer un graphique.")
+            
+            # On récupère directement le DataFrame vivant
+            df_for_chart = artifact_store.get(data_ref_for_chart)
+            
+            chart_json = _create_dynamic_chart_logic(
+                data=df_for_chart,  # <--- Le DataFrame est passé directement
+                chart_type=tool_args.get('chart_type'),
+                x_column=tool_args.get('x_column'),
+                y_column=tool_args.get('y_column'),
+                title=tool_args.get('title'),
+                color_column=tool_args.get('color_column')
+            )
             
-        except Exception as e:
-            # Bloc de capture générique pour toutes les autres erreurs
-            error_msg = f"Erreur lors de l'exécution de l'outil '{tool_name}': {repr(e)}"
-            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=f"[ERREUR: {error_msg}]"))
-            current_state_updates["error"] = error_msg
-            print(error_msg)
             
+            if chart_json.startswith("Erreur"):
+                raise ValueError(chart_json) # Transforme l'erreur de l'outil en exception
+            
+            updates["plotly_json"] = chart_json
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique interactif créé.]"))
+
+        elif tool_name in ["display_raw_data", "display_processed_data"]:
+            if not state.get("fetched_df_ref"):
+                 raise ValueError("Aucune donnée disponible à afficher.")
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Préparation de l'affichage des données.]"))
+
+        elif tool_name == "get_company_profile":
+            ticker = tool_args.get("ticker")
+            profile_json = _fetch_profile_logic(ticker=ticker)
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=profile_json))
+        
+        elif tool_name == "display_price_chart":
+            import plotly.express as px
+            ticker = tool_args.get("ticker")
+            period = tool_args.get("period_days", 252) # Utilise la valeur par défaut si non fournie
+            
+            # On appelle notre logique pour récupérer les données de prix
+            price_df = _fetch_price_history_logic(ticker=ticker, period_days=period)
+            # Sur les longues périodes, on ne garde que les points qui dessinent la courbe ;
+            # le mode de rendu dépend des points réellement envoyés au navigateur
+            price_df = downsample_frame(price_df)
+            render_mode = chart_render_mode(price_df)
+            
+            # On crée le graphique directement ici
+            fig = px.line(
+                price_df, 
+                x=price_df.index, 
+                y='close', 
+                title=f"Historique du cours de {ticker.upper()} sur {period} jours",
+                color_discrete_sequence=stella_theme['colors'],
+                render_mode=render_mode
+            )
+            fig.update_layout(template=stella_theme['template'], font=stella_theme['font'], xaxis_title="Date", yaxis_title="Prix de clôture (USD)")
+            
+            # On convertit en JSON et on met à jour l'état
+            chart_json = encode_figure(fig)
+            updates["plotly_json"] = chart_json
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique de prix créé avec succès.]"))
+
+        elif tool_name == "compare_stocks":
+            import plotly.express as px
+            tickers = tool_args.get("tickers")
+            metric = tool_args.get("metric")
+            comparison_type = tool_args.get("comparison_type", "fundamental")
+
+            if comparison_type == 'fundamental':
+                # On appelle la fonction qui retourne l'historique
+                comp_df = _compare_fundamental_metrics_logic(tickers=tickers, metric=metric)
+                fig = px.line(
+                    comp_df,
+                    x=comp_df.index,
+                    y=comp_df.columns,
+                    title=f"Évolution de la métrique '{metric.upper()}'",
+                    labels={'value': metric.upper(), 'variable': 'Ticker', 'calendarYear': 'Année'},
+                    markers=True, # Les marqueurs sont utiles pour voir les points de données annuels
+                    color_discrete_sequence=stella_theme['colors']  # Utilise la palette de couleurs Stella
+                )
+            elif comparison_type == 'price':
+                # La logique pour le prix ne change pas, elle est déjà une évolution
+                period = tool_args.get("period_days", 252)
+                comp_df = _compare_price_histories_logic(tickers=tickers, period_days=period)
+                comp_df = downsample_frame(comp_df)
+                render_mode = chart_render_mode(comp_df)
+                fig = px.line(
+                    comp_df,
+                    title=f"Comparaison de la performance des actions (Base 100)",
+                    labels={'value': 'Performance Normalisée (Base 100)', 'variable': 'Ticker', 'index': 'Date'},
+                    color_discrete_sequence=stella_theme['colors'],
+                    render_mode=render_mode
+                )
+            else:
+                raise ValueError(f"Type de comparaison inconnu: {comparison_type}")
+
+            # Le reste du code est commun et ne change pas
+            fig.update_layout(template="plotly_white")
+            chart_json = encode_figure(fig)
+            updates["plotly_json"] = chart_json
+            updates["tickers"] = tickers
+            tool_outputs.append(ToolMessage(tool_call_id=tool_id, content="[Graphique de comparaison créé.]"))
+        
+    except Exception as e:
+        # Bloc de capture générique pour toutes les autres erreurs
+        error_msg = f"Erreur lors de l'exécution de l'outil '{tool_name}': {repr(e)}"
+        tool_outputs.append(ToolMessage(tool_call_id=tool_id, content=f"[ERREUR: {error_msg}]"))
+        updates["error"] = error_msg
+        print(error_msg)
+
+    return tool_outputs, updates
+
+# Dépendances entre outils d'un même tour : un outil attend la fin des outils dont il lit le résultat
+# dans l'état (ex: preprocess_data lit le DataFrame produit par fetch_data).
+TOOL_DEPENDENCIES = {
+    "preprocess_data": {"fetch_data", "full_analysis"},
+    "analyze_risks": {"fetch_data", "preprocess_data", "full_analysis"},
+    "create_dynamic_chart": {"fetch_data", "preprocess_data", "full_analysis"},
+    "display_raw_data": {"fetch_data", "full_analysis"},
+    "display_processed_data": {"fetch_data", "preprocess_data", "full_analysis"},
+    "get_stock_news": {"search_ticker", "full_analysis"},
+}
+TOOL_MAX_WORKERS = int(os.getenv("STELLA_TOOL_MAX_WORKERS", 4))
+
+def _plan_tool_stages(tool_calls: list) -> list:
+    """
+    Regroupe les appels d'outils en étapes successives : les appels d'une même étape sont
+    indépendants et peuvent s'exécuter en parallèle ; un appel est placé après la dernière
+    étape contenant un outil dont il dépend (et qui le précède dans la liste).
+    """
+    stage_of_call = []
+    for i, tool_call in enumerate(tool_calls):
+        dependencies = TOOL_DEPENDENCIES.get(tool_call['name'], set())
+        stage = 1 + max((stage_of_call[j] for j in range(i) if tool_calls[j]['name'] in dependencies), default=-1)
+        stage_of_call.append(stage)
+    stages = [[] for _ in range(max(stage_of_call, default=-1) + 1)]
+    for i, stage in enumerate(stage_of_call):
+        stages[stage].append(i)
+    return stages
+
+# Noeud 2 : execute_tool_node, exécute les outils en se basant sur la décision de l'agent_node (Noeud 1).
+def execute_tool_node(state: AgentState, config: RunnableConfig):
+    """
+    Le "pont" qui exécute la logique réelle et met à jour l'état.
+    Les appels d'outils indépendants d'un même tour s'exécutent en parallèle ; les résultats
+    sont ensuite fusionnés dans l'ordre des appels (le dernier appel l'emporte sur une même clé),
+    exactement comme une exécution séquentielle.
+    """
+    print("\n--- OUTILS: Exécution d'un outil ---")
+    session_id = config.get("configurable", {}).get("thread_id", "default")
+    action_message = next((msg for msg in reversed(state['messages']) if isinstance(msg, AIMessage) and msg.tool_calls), None)
+    if not action_message:
+        raise ValueError("Aucun appel d'outil trouvé dans le dernier AIMessage.")
+
+    tool_calls = action_message.tool_calls
+    results = [None] * len(tool_calls)
+
+    for stage in _plan_tool_stages(tool_calls):
+        # Chaque étape voit l'état mis à jour par les étapes précédentes
+        state_view = dict(state)
+        for i in range(len(tool_calls)):
+            if results[i] is not None:
+                state_view.update(results[i][1])
+
+        if len(stage) == 1:
+            results[stage[0]] = _run_tool_call(tool_calls[stage[0]], state_view, session_id)
+        else:
+            print(f"Exécution en parallèle de : {[tool_calls[i]['name'] for i in stage]}")
+            with ThreadPoolExecutor(max_workers=min(len(stage), TOOL_MAX_WORKERS), thread_name_prefix="tool-call") as executor:
+                futures = {i: executor.submit(_run_tool_call, tool_calls[i], state_view, session_id) for i in stage}
+                for i, future in futures.items():
+                    results[i] = future.result()
+
+    # Fusion déterministe, dans l'ordre des appels demandés par le LLM
+    tool_outputs = []
+    current_state_updates = {}
+    for call_outputs, call_updates in results:
+        tool_outputs.extend(call_outputs)
+        current_state_updates.update(call_updates)
+
     current_state_updates["messages"] = tool_outputs
     return current_state_updates
 
@@ -392,16 +570,17 @@ def generate_final_response_node(state: AgentState):
     # --- 1. Récupération des informations de l'état ---
     ticker = state.get("ticker", "l'action")
     analysis_result = state.get("analysis", "inconnu")
-    processed_df_json = state.get("processed_df_json")
+    processed_df_ref = state.get("processed_df_ref")
+    df = None
 
     # --- 2. Construction de la réponse textuelle ---
     response_content = ""
     latest_year_str = "récentes"
     next_year_str = "prochaine"
     
-    if processed_df_json:
+    if processed_df_ref:
         try:
-            df = pd.read_json(StringIO(processed_df_json), orient='split')
+            df = artifact_store.get(processed_df_ref)
             if not df.empty and 'calendarYear' in df.columns:
                 latest_year_str = df['calendarYear'].iloc[-1]
                 next_year_str = str(int(latest_year_str) + 1)
@@ -425,9 +604,8 @@ def generate_final_response_node(state: AgentState):
     # --- 3. Création du graphique de synthèse ---
     chart_json = None
     explanation_text = None 
-    if processed_df_json:
+    if df is not None:
         try:
-            df = pd.read_json(StringIO(processed_df_json), orient='split')
             # Les colonnes dont nous avons besoin pour ce nouveau graphique
             metrics_to_plot = ['calendarYear', 'revenuePerShare_YoY_Growth', 'earningsYield']
             
@@ -435,6 +613,7 @@ def generate_final_response_node(state: AgentState):
             plot_cols = [col for col in metrics_to_plot if col in df.columns]
             
             if not df.empty and all(col in plot_cols for col in metrics_to_plot):
+                import plotly.graph_objects as go
                 chart_title = f"Analyse Croissance vs. Valorisation pour {ticker.upper()}"
                 
                 # Créer la figure de base
@@ -504,7 +683,7 @@ def generate_final_response_node(state: AgentState):
                     )
                 )
                 
-                chart_json = pio.to_json(fig)
+                chart_json = encode_figure(fig)
                 response_content += f"\n\n**Voici une visualisation de sa croissance par rapport à sa valorisation :**"
                 
                 # On crée le texte explicatif et on l'ajoute à la suite
@@ -543,10 +722,12 @@ def cleanup_state_node(state: AgentState):
     Il efface les données spécifiques à la dernière réponse (prédiction, graphique)
     mais GARDE le contexte principal (données brutes et traitées, ticker)
     pour permettre des questions de suivi.
+    C'est aussi la frontière de checkpoint : les DataFrames de la session y sont sérialisés.
     """
     print("\n--- SYSTEM: Nettoyage partiel de l'état avant la sauvegarde ---")
+    artifact_store.persist([state.get("fetched_df_ref"), state.get("processed_df_ref")])
     
-    # On garde : 'ticker', 'tickers', 'company_name', 'fetched_df_json', 'processed_df_json'
+    # On garde : 'ticker', 'tickers', 'company_name', 'fetched_df_ref', 'processed_df_ref' (et leurs schémas)
     # On supprime (réinitialise) :
     return {
         "analysis": "",   # Efface la prédiction précédente
@@ -561,16 +742,18 @@ def prepare_data_display_node(state: AgentState):
     
     tool_name_called = next(msg for msg in reversed(state['messages']) if isinstance(msg, AIMessage) and msg.tool_calls).tool_calls[-1]['name']
 
-    if tool_name_called == "display_processed_data" and state.get("processed_df_json"):
-        df_json = state["processed_df_json"]
+    if tool_name_called == "display_processed_data" and state.get("processed_df_ref"):
+        df_ref = state["processed_df_ref"]
         message_content = "Voici les données **pré-traitées** que tu as demandées :"
-    elif tool_name_called == "display_raw_data" and state.get("fetched_df_json"):
-        df_json = state["fetched_df_json"]
+    elif tool_name_called == "display_raw_data" and state.get("fetched_df_ref"):
+        df_ref = state["fetched_df_ref"]
         message_content = "Voici les données **brutes** que tu as demandées :"
     else:
         final_message = AIMessage(content="Désolé, les données demandées ne sont pas disponibles.")
         return {"messages": [final_message]}
 
+    # Seul le tableau affiché dans le chat est sérialisé
+    df_json = artifact_store.get(df_ref).to_json(orient='split')
     final_message = AIMessage(content=message_content)
     setattr(final_message, 'dataframe_json', df_json)
     return {"messages": [final_message]}
@@ -613,7 +796,7 @@ def prepare_news_display_node(state: AgentState):
     
     return {"messages": [final_message]}
 
-def prepare_profile_display_node(state: AgentState):
+def prepare_profile_display_node(state: AgentState, config: RunnableConfig):
     """Prépare un AIMessage avec le profil de l'entreprise pour l'affichage."""
     print("\n--- AGENT: Préparation de l'affichage du profil d'entreprise ---")
     
@@ -636,7 +819,7 @@ def prepare_profile_display_node(state: AgentState):
     Si tu ne trouves pas d'informations, indique simplement "Inconnu" ou "Non disponible".
     Termine en donnant le lien vers leur site web.
     """
-    response = llm.invoke(prompt)
+    response = get_llm().invoke(prompt, config=config)
     print(f"response.content: {response.content}")
     final_message = AIMessage(content=response.content)
     
@@ -711,7 +894,7 @@ def router(state: AgentState) -> str:
     print(f"--- ROUTEUR: Le dernier outil appelé était '{tool_name}'. ---")
 
     # Maintenant, on décide de la suite en fonction de cet outil.
-    if tool_name == 'analyze_risks':
+    if tool_name in ['analyze_risks', 'full_analysis']:
         return "generate_final_response"
     elif tool_name == 'compare_stocks': 
         return "prepare_chart_display"
@@ -729,7 +912,9 @@ def router(state: AgentState) -> str:
         return "agent"
     
 # --- CONSTRUCTION DU GRAPH ---
-memory = MemorySaver()
+# Checkpointer SQLite borné : historique limité par session, sessions inactives évincées
+# (avec leurs artefacts), pour que l'empreinte mémoire reste stable sous charge.
+memory = BoundedSqliteSaver.from_path(on_thread_evicted=artifact_store.drop_session)
 workflow = StateGraph(AgentState)
 
 workflow.add_node("agent", agent_node)
@@ -773,188 +958,230 @@ workflow.add_edge("cleanup_state", END)
 
 app = workflow.compile(checkpointer=memory)
 
-# --- Crée une visualisation du Graph ---
-try:
-    graph = app.get_graph()
-    image_bytes = graph.draw_mermaid_png()
-    with open("agent_workflow.png", "wb") as f:
-        f.write(image_bytes)
-    
-    print("\nVisualisation du graph sauvegardée dans le répertoire en tant que agent_workflow.png \n")
+# Journal périodique des quotas et caches des fournisseurs (STELLA_METRICS_LOG_SECONDS)
+start_metrics_logger()
 
-except Exception as e:
-    print(f"\nJe n'ai pas pu générer la visualisation. Lancez 'pip install playwright' et 'playwright install'. Erreur: {e}\n")
+# Cache disque des rendus du graphe, indexé par le hash de sa description (un seul rendu par version du graphe)
+GRAPH_RENDER_CACHE_DIR = os.path.join(CACHE_DIR, "graph")
+
+def _graph_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+def _write_cached_render(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+# --- Crée une visualisation du Graph (à la demande) ---
+def save_workflow_png(path: str = "agent_workflow.png") -> bool:
+    """
+    Enregistre l'image du graphe (rendu Mermaid). Le rendu, qui peut passer par un service
+    distant ou playwright, est mis en cache selon le hash du graphe : il n'est refait que si
+    le graphe change.
+    """
+    try:
+        graph = app.get_graph()
+        mermaid_source = graph.draw_mermaid()
+        png_path = os.path.join(GRAPH_RENDER_CACHE_DIR, f"{_graph_hash(mermaid_source)}.png")
+        if not os.path.exists(png_path):
+            image_bytes = graph.draw_mermaid_png()
+            _write_cached_render(png_path, image_bytes)
+        shutil.copyfile(png_path, path)
+        print(f"\nVisualisation du graph sauvegardée dans le répertoire en tant que {path} \n")
+        return True
+
+    except Exception as e:
+        print(f"\nJe n'ai pas pu générer la visualisation. Lancez 'pip install playwright' et 'playwright install'. Erreur: {e}\n")
+        return False
 
 # --- Crée une animation du workflow ---
+def _format_tool_calls_label(tool_calls: list) -> str:
+    """Libellé du noeud 'execute_tool' : outils appelés et leurs arguments."""
+    labels = []
+    for tool_call in tool_calls:
+        args_str_parts = []
+        for k, v in tool_call['args'].items():
+            if isinstance(v, str):
+                args_str_parts.append(f"{k}='{v}'")
+            elif isinstance(v, list):
+                # Gère les listes comme [item1, item2]
+                formatted_list = ", ".join([f"'{item}'" if isinstance(item, str) else str(item) for item in v])
+                args_str_parts.append(f"{k}=[{formatted_list}]")
+            else:
+                # Gère les nombres et autres types
+                args_str_parts.append(f"{k}={v}")
+
+        args_display = ", ".join(args_str_parts)
+        # Ajoute les parenthèses seulement s'il y a des arguments
+        labels.append(f"{tool_call['name']} ({args_display})" if args_display else tool_call['name'])
+    return "execute_tool : " + ", ".join(labels)
+
+def _trace_steps_from_store(thread_id: str) -> list:
+    """Étapes de la dernière exécution, enregistrées localement par le TraceRecorder."""
+    run = trace_store.last_run(thread_id)
+    return run["steps"] if run else []
+
+def _trace_steps_from_langsmith(thread_id: str) -> list:
+    """Repli : reconstruit les étapes de la dernière exécution à partir de LangSmith (réseau)."""
+    from langsmith import Client
+
+    client = Client()
+    all_runs = list(client.list_runs(
+        project_name=os.environ.get("LANGCHAIN_PROJECT", "stella"),
+        thread_id=thread_id,
+    ))
+
+    # Find the main thread run (root run)
+    thread_run = next((r for r in all_runs if not r.parent_run_id), None)
+    if not thread_run:
+        print("--- VISUALIZER: Exécution principale du thread introuvable.")
+        return []
+
+    # Get node-level runs, sorted by start time
+    trace_nodes_runs = sorted(
+        [r for r in all_runs if r.parent_run_id == thread_run.id],
+        key=lambda r: r.start_time
+    )
+
+    steps = []
+    for run in trace_nodes_runs:
+        tool_calls = []
+        if run.name == "execute_tool" and run.inputs and 'messages' in run.inputs:
+            # Les messages dans LangSmith Run.inputs sont des dictionnaires
+            # On cherche le dernier AIMessage avec tool_calls
+            for msg_dict in reversed(run.inputs['messages']):
+                if isinstance(msg_dict, dict) and msg_dict.get('type') == 'ai' and msg_dict.get('tool_calls'):
+                    tool_calls = msg_dict['tool_calls']
+                    break
+        duration = (run.end_time - run.start_time).total_seconds() if run.end_time else None
+        steps.append({"node": run.name, "tool_calls": tool_calls, "duration": duration, "error": run.error})
+    return steps
+
+# Thème du graphe animé (couleurs de chart_theme.py)
+TRACE_GRAPH_STYLE = {
+    "graph": {
+        "fontname": "Arial",
+        "bgcolor": "transparent", # Fond transparent
+        "rankdir": "TB", # Top-to-Bottom layout
+    },
+    "nodes": {
+        "fontname": "Arial",
+        "shape": "box", # Forme rectangulaire
+        "style": "rounded,filled", # Bords arrondis et remplis
+        "fillcolor": "#1C202D", # Couleur de fond des noeuds (thème sombre)
+        "color": "#FAFAFA", # Couleur de la bordure
+        "fontcolor": "#FAFAFA", # Couleur du texte
+    },
+    "edges": {
+        "color": "#6c757d", # Couleur gris doux pour les flèches
+        "arrowsize": "0.8",
+    },
+    "highlight": {
+        "fillcolor": "#33FFBD", # Couleur du noeud actif
+        "color": "#33FFBD", # Bordure du noeud actif
+        "edge_color": "#33FFBD", # Couleur de la flèche active
+    }
+}
+_graph_svg_cache = {}
+
+def trace_edge_id(source: str, target: str) -> str:
+    """Identifiant SVG d'une arête du graphe, utilisé pour la surligner côté navigateur."""
+    return f"edge_{source}__{target}"
+
+def _build_graph_dot() -> str:
+    """DOT du graphe complet, sans surbrillance : chaque noeud et arête porte un id SVG stable."""
+    graph_json = app.get_graph().to_json()
+    graph_attrs = ' '.join([f'{k}="{v}"' for k, v in TRACE_GRAPH_STYLE["graph"].items()])
+    node_attrs = ' '.join([f'{k}="{v}"' for k, v in TRACE_GRAPH_STYLE["nodes"].items()])
+    edge_attrs = ' '.join([f'{k}="{v}"' for k, v in TRACE_GRAPH_STYLE["edges"].items()])
+
+    dot_lines = [
+        "digraph {",
+        f"  graph [{graph_attrs}];",
+        f"  node [{node_attrs}];",
+        f"  edge [{edge_attrs}];",
+    ]
+    for node in graph_json["nodes"]:
+        label = node["data"]["name"] if "data" in node and "name" in node["data"] else node["id"]
+        dot_lines.append(f'  "{node["id"]}" [id="node_{node["id"]}", label="{label}"];')
+    for edge in graph_json["edges"]:
+        source, target = edge["source"], edge["target"]
+        dot_lines.append(f'  "{source}" -> "{target}" [id="{trace_edge_id(source, target)}"];')
+    dot_lines.append("}")
+    return "\n".join(dot_lines)
+
+def render_graph_svg() -> str:
+    """
+    Renvoie le graphe de l'agent mis en page et rendu une seule fois en SVG.
+    Le rendu est mis en cache (mémoire puis disque) selon le hash du DOT : Graphviz
+    n'est relancé que si le graphe ou son thème change.
+    """
+    dot_source = _build_graph_dot()
+    graph_hash = _graph_hash(dot_source)
+    if graph_hash in _graph_svg_cache:
+        return _graph_svg_cache[graph_hash]
+
+    svg_path = os.path.join(GRAPH_RENDER_CACHE_DIR, f"{graph_hash}.svg")
+    try:
+        with open(svg_path, "r", encoding="utf-8") as f:
+            svg = f.read()
+    except OSError:
+        print(f"--- VISUALIZER: Rendu SVG du graphe ({graph_hash})")
+        import graphviz
+        svg = graphviz.Source(dot_source).pipe(format='svg').decode("utf-8")
+        _write_cached_render(svg_path, svg.encode("utf-8"))
+    _graph_svg_cache[graph_hash] = svg
+    return svg
+
 def generate_trace_animation_frames(thread_id: str):
     """
-    Récupère une trace LangSmith et génère une série d'images Graphviz au style moderne.
+    Décrit pas à pas la dernière exécution de la session, pour animer le graphe rendu par
+    `render_graph_svg`. Chaque étape est un petit dictionnaire : noeud et arête à surligner,
+    description et libellé des outils appelés. Aucune image n'est générée ici.
+
+    La trace provient du TraceRecorder local (instantané, hors ligne) ; LangSmith n'est
+    interrogé qu'en repli, si aucune trace locale n'existe (ex: après un redémarrage).
     """
     print(f"--- VISUALIZER: Génération de l'animation pour : {thread_id} ---")
     try:
-        # --- 1. DÉFINITION DU THÈME MODERNE ---
-        style_config = {
-            "graph": {
-                "fontname": "Arial",
-                "bgcolor": "transparent", # Fond transparent
-                "rankdir": "TB", # Top-to-Bottom layout
-            },
-            "nodes": {
-                "fontname": "Arial",
-                "shape": "box", # Forme rectangulaire
-                "style": "rounded,filled", # Bords arrondis et remplis
-                "fillcolor": "#1C202D", # Couleur de fond des noeuds (thème sombre)
-                "color": "#FAFAFA", # Couleur de la bordure
-                "fontcolor": "#FAFAFA", # Couleur du texte
-            },
-            "edges": {
-                "color": "#6c757d", # Couleur gris doux pour les flèches
-                "arrowsize": "0.8",
-            },
-            "highlight": {
-                "fillcolor": "#33FFBD", # Couleur orange pour le noeud actif (de chart_theme.py)
-                "color": "#33FFBD", # Bordure blanche pour le noeud actif
-                "edge_color": "#33FFBD", # Couleur orange pour la flèche active
-            }
-        }
-
-        client = Client()
-        all_runs = list(client.list_runs(
-            project_name=os.environ.get("LANGCHAIN_PROJECT", "stella"),
-            thread_id=thread_id,
-        ))
-
-        if not all_runs:
-            print("--- VISUALIZER: Aucune exécution trouvée pour cet ID de thread.")
-            return []
+        trace_steps = _trace_steps_from_store(thread_id)
+        if not trace_steps:
+            print("--- VISUALIZER: Aucune trace locale pour ce thread, repli sur LangSmith.")
+            trace_steps = _trace_steps_from_langsmith(thread_id)
 
-        # Find the main thread run (root run)
-        thread_run = next((r for r in all_runs if not r.parent_run_id), None)
-        if not thread_run:
-            print("--- VISUALIZER: Exécution principale du thread introuvable.")
+        if not trace_steps:
+            print("--- VISUALIZER: Aucune exécution trouvée pour cet ID de thread.")
             return []
 
-        # Get node-level runs, sorted by start time
-        trace_nodes_runs = sorted(
-            [r for r in all_runs if r.parent_run_id == thread_run.id],
-            key=lambda r: r.start_time
-        )
-
         # Build the full trace path, including start and end
-        # This list directly maps to the order of runs in trace_nodes_runs
-        # The index in trace_nodes_runs will be (index in full_trace_path - 1)
-        full_trace_path_names = [run.name for run in trace_nodes_runs]
-        full_trace_path = ["__start__"] + full_trace_path_names + ["__end__"]
-
-        if not trace_nodes_runs:
-            print("--- VISUALIZER: Aucun noeud enfant (étape) trouvé dans la trace.")
-            return []
-
+        # The step for full_trace_path[i] is trace_steps[i - 1]
+        full_trace_path = ["__start__"] + [step["node"] for step in trace_steps] + ["__end__"]
         print(f"--- VISUALIZER: Chemin d'exécution trouvé : {' -> '.join(full_trace_path)}")
 
-        graph_json = app.get_graph().to_json()
-        
         frames = []
-        previous_node_in_trace = full_trace_path[0] # This tracks the previous node *in the path*, not graphviz node id
-        
-        # Create a mapping from node_id in graph_json to its original label for efficiency
-        node_labels_map = {}
-        for node in graph_json["nodes"]:
-            node_labels_map[node["id"]] = node["data"]["name"] if "data" in node and "name" in node["data"] else node["id"]
-
-
+        previous_node_in_trace = None
         for i, current_node_name_in_trace in enumerate(full_trace_path):
-            # The node ID in Graphviz will be the same as the run.name for actual nodes
-            # For __start__ and __end__, they are special
-            node_id_to_highlight = current_node_name_in_trace
-
-            # --- 2. CONSTRUCTION DU DOT STRING AVEC STYLE ---
-            
-            # Attributs globaux pour le graphe
-            graph_attrs = ' '.join([f'{k}="{v}"' for k, v in style_config["graph"].items()])
-            node_attrs = ' '.join([f'{k}="{v}"' for k, v in style_config["nodes"].items()])
-            edge_attrs = ' '.join([f'{k}="{v}"' for k, v in style_config["edges"].items()])
-
-            dot_lines = [
-                "digraph {",
-                f"  graph [{graph_attrs}];",
-                f"  node [{node_attrs}];",
-                f"  edge [{edge_attrs}];",
-            ]
-            
-            # Ajout des noeuds
-            for node_in_graph_def in graph_json["nodes"]: 
-                node_id_from_graph_def = node_in_graph_def["id"]
-                display_label = node_labels_map[node_id_from_graph_def] 
-
-                if node_id_from_graph_def == current_node_name_in_trace:
-                    # Appliquer le libellé personnalisé pour 'execute_tool' UNIQUEMENT s'il est le nœud mis en évidence
-                    if node_id_from_graph_def == "execute_tool":
-                        # Le Run object correspondant est trace_nodes_runs[i-1] car full_trace_path inclut __start__ au début.
-                        # On s'assure que l'index est valide pour trace_nodes_runs
-                        if i > 0 and i <= len(trace_nodes_runs): 
-                            specific_run = trace_nodes_runs[i-1] # Le Run object de Langsmith pour ce noeud 'execute_tool'
-                            if specific_run.name == "execute_tool": # Double vérification que le nom correspond bien
-                                if specific_run.inputs and 'messages' in specific_run.inputs:
-                                    # Parcourir les messages d'entrée en sens inverse pour trouver le dernier AIMessage avec tool_calls
-                                    for msg_dict in reversed(specific_run.inputs['messages']):
-                                        # Les messages dans LangSmith Run.inputs sont des dictionnaires
-                                        if isinstance(msg_dict, dict) and msg_dict.get('type') == 'ai' and msg_dict.get('tool_calls'):
-                                            first_tool_call = msg_dict['tool_calls'][0] # On prend le premier tool_call (souvent le seul)
-                                            tool_name = first_tool_call['name']
-                                            tool_args = first_tool_call['args']
-                                            
-                                            args_str_parts = []
-                                            for k, v in tool_args.items():
-                                                if isinstance(v, str):
-                                                    args_str_parts.append(f"{k}='{v}'")
-                                                elif isinstance(v, list):
-                                                    # Gère les listes comme [item1, item2]
-                                                    formatted_list = ", ".join([f"'{item}'" if isinstance(item, str) else str(item) for item in v])
-                                                    args_str_parts.append(f"{k}=[{formatted_list}]")
-                                                else:
-                                                    # Gère les nombres et autres types
-                                                    args_str_parts.append(f"{k}={v}")
-                                            
-                                            args_display = ", ".join(args_str_parts)
-                                            if args_display: # Ajoute les parenthèses seulement s'il y a des arguments
-                                                display_label = f"execute_tool : {tool_name} ({args_display})"
-                                            else:
-                                                display_label = f"execute_tool : {tool_name}"
-                                            break # On a trouvé le bon message, on peut sortir de cette boucle interne
-                        else:
-                             print(f"Warning: Index de trace ({i}) hors limites ou nœud spécial pour {node_id_from_graph_def}")
-
-
-                    highlight_attrs = ' '.join([f'{k}="{v}"' for k, v in style_config["highlight"].items() if 'edge' not in k])
-                    dot_lines.append(f'  "{node_id_from_graph_def}" [label="{display_label}", {highlight_attrs}];')
-                else:
-                    dot_lines.append(f'  "{node_id_from_graph_def}" [label="{display_label}"];') # Utilise le libellé original pour les nœuds non surlignés
-            
-            # Ajout des arêtes
-            for edge in graph_json["edges"]:
-                source = edge["source"]
-                target = edge["target"]
-                
-                # Appliquer le style de surbrillance si c'est l'arête active
-                if source == previous_node_in_trace and target == current_node_name_in_trace:
-                    dot_lines.append(f'  "{source}" -> "{target}" [color="{style_config["highlight"]["edge_color"]}", penwidth=2.5];')
-                else:
-                    dot_lines.append(f'  "{source}" -> "{target}";')
-            
-            dot_lines.append("}")
-            modified_dot = "\n".join(dot_lines)
-            
-            g = graphviz.Source(modified_dot)
-            png_bytes = g.pipe(format='png')
+            step = trace_steps[i - 1] if 0 < i <= len(trace_steps) else None
 
             step_description = f"Step {i+1}: Transition vers le noeud '{current_node_name_in_trace}'"
             if i == 0:
                 step_description = "Step 1: Début de l'exécution"
             elif i == len(full_trace_path) - 1:
                 step_description = f"Step {i+1}: Fin de l'exécution"
-            frames.append((step_description, png_bytes))
-
+            elif step and step.get("duration") is not None:
+                step_description += f" ({step['duration']:.2f}s)"
+            if step and step.get("error"):
+                step_description += " ⚠️ erreur"
+
+            frames.append({
+                "description": step_description,
+                "node": f"node_{current_node_name_in_trace}",
+                "edge": trace_edge_id(previous_node_in_trace, current_node_name_in_trace) if previous_node_in_trace else None,
+                # Libellé personnalisé pour 'execute_tool' : outils appelés et leurs arguments
+                "label": _format_tool_calls_label(step["tool_calls"]) if step and step.get("tool_calls") else None,
+            })
             previous_node_in_trace = current_node_name_in_trace
 
         return frames
@@ -979,5 +1206,6 @@ if __name__ == '__main__':
             if hasattr(final_message, 'image_base64'):
                 print("\n[L'image a été générée et ajoutée au message final]")
 
+    save_workflow_png()
     conversation_id = f"test_session_{uuid.uuid4()}"
     run_conversation(conversation_id, "S'il te plaît, fais une analyse complète de GOOGL")
\ No newline at end of file
@@ -0,0 +1,104 @@
+# artifacts.py
+
+import os
+import uuid
+import threading
+import shutil
+from collections import OrderedDict
+import pandas as pd
+
+from src.cache import CACHE_DIR
+
+ARTIFACT_DIR = os.getenv("STELLA_ARTIFACT_DIR", os.path.join(CACHE_DIR, "artifacts"))
+# Nombre de DataFrames gardés en mémoire (au-delà, les plus anciens sont déchargés sur disque)
+ARTIFACT_MAX_IN_MEMORY = int(os.getenv("STELLA_ARTIFACT_MAX_IN_MEMORY", 64))
+
+
+def describe_frame(df: pd.DataFrame) -> dict:
+    """Métadonnées de schéma gardées dans l'état de l'agent, pour ne pas avoir à relire le DataFrame."""
+    return {"columns": [str(col) for col in df.columns], "n_rows": int(len(df))}
+
+
+class ArtifactStore:
+    """
+    Stockage en mémoire des DataFrames manipulés par l'agent, par session.
+
+    L'état LangGraph ne transporte qu'un identifiant opaque ("handle") : les DataFrames
+    restent vivants en mémoire entre les noeuds, sans aller-retour JSON. Ils ne sont
+    sérialisés sur disque qu'aux frontières de checkpoint (fin de tour, via `persist`)
+    ou lorsqu'ils sont déchargés de la mémoire.
+    Les DataFrames renvoyés par `get` sont partagés : ils ne doivent pas être modifiés en place.
+    """
+
+    def __init__(self, directory: str = ARTIFACT_DIR, max_in_memory: int = ARTIFACT_MAX_IN_MEMORY):
+        self.directory = directory
+        self.max_in_memory = max_in_memory
+        self._frames = OrderedDict()
+        self._persisted = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session_dir_name(session_id: str) -> str:
+        return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(session_id))
+
+    def _path(self, handle: str) -> str:
+        session_id, artifact_id = handle.rsplit("/", 1)
+        return os.path.join(self.directory, session_id, f"{artifact_id}.pkl")
+
+    def _write(self, handle: str, df: pd.DataFrame) -> None:
+        path = self._path(handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self._persisted.add(handle)
+
+    def _evict(self) -> None:
+        """Éviction LRU (verrou déjà pris) : un DataFrame déchargé est d'abord écrit sur disque."""
+        while len(self._frames) > self.max_in_memory:
+            old_handle, old_df = self._frames.popitem(last=False)
+            if old_handle not in self._persisted:
+                self._write(old_handle, old_df)
+
+    def put(self, df: pd.DataFrame, session_id: str = "default") -> str:
+        """Enregistre un DataFrame et renvoie son handle."""
+        handle = f"{self._session_dir_name(session_id)}/{uuid.uuid4().hex}"
+        with self._lock:
+            self._frames[handle] = df
+            self._evict()
+        return handle
+
+    def get(self, handle: str) -> pd.DataFrame:
+        """Renvoie le DataFrame associé au handle (depuis la mémoire, sinon depuis le disque)."""
+        with self._lock:
+            if handle in self._frames:
+                self._frames.move_to_end(handle)
+                return self._frames[handle]
+        try:
+            df = pd.read_pickle(self._path(handle))
+        except (OSError, ValueError) as e:
+            raise KeyError(f"Artefact introuvable : {handle}") from e
+        with self._lock:
+            self._frames[handle] = df
+            self._persisted.add(handle)
+            self._evict()
+        return df
+
+    def persist(self, handles) -> None:
+        """Sérialise sur disque les artefacts pas encore persistés (appelé en fin de tour)."""
+        with self._lock:
+            for handle in handles:
+                if handle and handle in self._frames and handle not in self._persisted:
+                    self._write(handle, self._frames[handle])
+
+    def drop_session(self, session_id: str) -> None:
+        """Supprime tous les artefacts (mémoire et disque) d'une session."""
+        prefix = f"{self._session_dir_name(session_id)}/"
+        with self._lock:
+            for handle in [h for h in self._frames if h.startswith(prefix)]:
+                del self._frames[handle]
+            self._persisted = {h for h in self._persisted if not h.startswith(prefix)}
+        shutil.rmtree(os.path.join(self.directory, self._session_dir_name(session_id)), ignore_errors=True)
+
+
+artifact_store = ArtifactStore()
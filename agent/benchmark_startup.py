@@ -0,0 +1,112 @@
+# agent/benchmark_startup.py
+"""
+Mesure du démarrage à froid de Stella :
+1. le temps d'import du module `agent` (dans un processus Python neuf, médiane de plusieurs essais) ;
+2. le temps jusqu'à la première réponse du serveur Streamlit : endpoint de santé, puis page d'accueil.
+
+Les deux mesures peuvent être faites en local ou dans le conteneur construit depuis le Dockerfile.
+
+Usage (depuis la racine du repo) :
+    python agent/benchmark_startup.py                   # en local
+    docker build -t stella .
+    python agent/benchmark_startup.py --image stella    # dans le conteneur
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Code exécuté dans un interpréteur neuf : seul l'import de `agent` est chronométré
+IMPORT_PROBE = (
+    "import sys, time; sys.path.insert(0, 'agent'); start = time.perf_counter(); import agent; "
+    "print(f'IMPORT_SECONDS={time.perf_counter() - start:.4f}'); "
+    "print('HEAVY_MODULES=' + ','.join(m for m in ('plotly', 'graphviz', 'langchain_groq', 'yfinance', 'sklearn') if m in sys.modules))"
+)
+
+
+def _probe_env() -> dict:
+    # agent.py exige une clé Groq à l'import ; aucune requête n'est envoyée pendant la mesure
+    return {**os.environ, "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "benchmark"}
+
+
+def _parse_probe(output: str) -> tuple:
+    values = dict(line.split("=", 1) for line in output.splitlines() if line.startswith(("IMPORT_SECONDS=", "HEAVY_MODULES=")))
+    return float(values["IMPORT_SECONDS"]), values.get("HEAVY_MODULES", "")
+
+
+def measure_import(runs: int, image: str = None) -> None:
+    durations = []
+    for _ in range(runs):
+        if image:
+            cmd = ["docker", "run", "--rm", "-e", "GROQ_API_KEY=benchmark", image, "python", "-c", IMPORT_PROBE]
+        else:
+            cmd = [sys.executable, "-c", IMPORT_PROBE]
+        result = subprocess.run(cmd, cwd=REPO_ROOT, env=_probe_env(), capture_output=True, text=True, check=True)
+        seconds, heavy_modules = _parse_probe(result.stdout)
+        durations.append(seconds)
+    print(f"Import de `agent` : médiane {statistics.median(durations):.3f}s (min {min(durations):.3f}s, max {max(durations):.3f}s, {runs} essais)")
+    print(f"Modules lourds chargés à l'import : {heavy_modules or 'aucun'}")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, deadline: float) -> bool:
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def measure_first_response(timeout: float, image: str = None) -> None:
+    port = _free_port()
+    if image:
+        cmd = ["docker", "run", "--rm", "-p", f"{port}:8501", "-e", "GROQ_API_KEY=benchmark", image]
+    else:
+        cmd = [sys.executable, "-m", "streamlit", "run", "agent/app.py", f"--server.port={port}",
+               "--server.headless=true", "--browser.gatherUsageStats=false"]
+
+    start = time.monotonic()
+    process = subprocess.Popen(cmd, cwd=REPO_ROOT, env=_probe_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        if not _wait_for(f"http://127.0.0.1:{port}/_stcore/health", deadline):
+            print(f"Le serveur n'a pas répondu en moins de {timeout:.0f}s.")
+            return
+        health_seconds = time.monotonic() - start
+        _wait_for(f"http://127.0.0.1:{port}/", deadline)
+        page_seconds = time.monotonic() - start
+        print(f"Serveur prêt (/_stcore/health) : {health_seconds:.3f}s")
+        print(f"Première réponse de la page d'accueil : {page_seconds:.3f}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid de Stella.")
+    parser.add_argument("--image", help="Image Docker à mesurer (sinon : environnement local).")
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de mesures du temps d'import.")
+    parser.add_argument("--timeout", type=float, default=120, help="Délai maximal d'attente du serveur (secondes).")
+    args = parser.parse_args()
+
+    measure_import(args.runs, args.image)
+    measure_first_response(args.timeout, args.image)
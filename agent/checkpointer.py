@@ -0,0 +1,119 @@
+# checkpointer.py
+
+import os
+import time
+import sqlite3
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from src.cache import CACHE_DIR
+
+CHECKPOINT_DB_PATH = os.getenv("STELLA_CHECKPOINT_DB", os.path.join(CACHE_DIR, "checkpoints.sqlite"))
+# Durée de vie d'une session inactive (secondes) avant éviction complète
+CHECKPOINT_THREAD_TTL_SECONDS = float(os.getenv("STELLA_CHECKPOINT_TTL_SECONDS", 24 * 3600))
+# Nombre maximal de checkpoints conservés par session (les plus récents)
+CHECKPOINT_MAX_PER_THREAD = int(os.getenv("STELLA_CHECKPOINT_MAX_PER_THREAD", 20))
+# Taille maximale (en octets) d'un champ texte de l'état enregistré dans un checkpoint
+CHECKPOINT_MAX_FIELD_BYTES = int(os.getenv("STELLA_CHECKPOINT_MAX_FIELD_BYTES", 256 * 1024))
+# Intervalle minimal entre deux passes d'éviction des sessions expirées
+CHECKPOINT_SWEEP_INTERVAL_SECONDS = float(os.getenv("STELLA_CHECKPOINT_SWEEP_SECONDS", 600))
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    Checkpointer SQLite (sur disque) dont l'empreinte reste bornée :
+    - seuls les `max_per_thread` derniers checkpoints de chaque session sont conservés ;
+    - les sessions inactives depuis plus de `thread_ttl` secondes sont supprimées ;
+    - les champs texte de l'état plus gros que `max_field_bytes` ne sont pas persistés.
+
+    `on_thread_evicted(thread_id)` est appelé pour chaque session expirée, afin de libérer
+    les ressources associées (ex: artefacts de la session).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, thread_ttl: float = CHECKPOINT_THREAD_TTL_SECONDS,
+                 max_per_thread: int = CHECKPOINT_MAX_PER_THREAD, max_field_bytes: int = CHECKPOINT_MAX_FIELD_BYTES,
+                 sweep_interval: float = CHECKPOINT_SWEEP_INTERVAL_SECONDS, on_thread_evicted=None, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.thread_ttl = thread_ttl
+        self.max_per_thread = max_per_thread
+        self.max_field_bytes = max_field_bytes
+        self.sweep_interval = sweep_interval
+        self.on_thread_evicted = on_thread_evicted
+        self._last_sweep = 0.0
+
+    @classmethod
+    def from_path(cls, path: str = CHECKPOINT_DB_PATH, **kwargs) -> "BoundedSqliteSaver":
+        """Ouvre (ou crée) la base de checkpoints, partagée entre les threads de Streamlit."""
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        # Table annexe : dernière activité de chaque session, pour l'éviction par TTL
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def _cap_large_fields(self, checkpoint):
+        """Remplace par une chaîne vide les champs texte trop volumineux (ex: graphique déjà affiché)."""
+        channel_values = checkpoint.get("channel_values", {})
+        oversized = [
+            key for key, value in channel_values.items()
+            if isinstance(value, str) and len(value.encode("utf-8")) > self.max_field_bytes
+        ]
+        if not oversized:
+            return checkpoint
+        print(f"Checkpointer: champs non persistés car trop volumineux : {oversized}")
+        capped_values = {key: ("" if key in oversized else value) for key, value in channel_values.items()}
+        return {**checkpoint, "channel_values": capped_values}
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved_config = super().put(config, self._cap_large_fields(checkpoint), metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_seen) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            # On ne garde que les N checkpoints les plus récents (les identifiants sont ordonnés dans le temps)
+            cur.execute(
+                """DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                       SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                       ORDER BY checkpoint_id DESC LIMIT ?)""",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_per_thread),
+            )
+            cur.execute(
+                """DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                       SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)""",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+            )
+
+        if time.time() - self._last_sweep > self.sweep_interval:
+            self.evict_expired_threads()
+        return saved_config
+
+    def evict_expired_threads(self) -> list:
+        """Supprime toutes les données des sessions inactives depuis plus que le TTL."""
+        self._last_sweep = time.time()
+        cutoff = self._last_sweep - self.thread_ttl
+        with self.cursor() as cur:
+            cur.execute("SELECT thread_id FROM thread_activity WHERE last_seen < ?", (cutoff,))
+            expired = [row[0] for row in cur.fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            print(f"Checkpointer: {len(expired)} session(s) expirée(s) supprimée(s).")
+        return expired
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+        if self.on_thread_evicted:
+            self.on_thread_evicted(str(thread_id))
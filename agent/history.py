@@ -0,0 +1,120 @@
+# history.py
+
+import os
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage, SystemMessage, BaseMessage
+
+# Politique d'historique envoyée au LLM par agent_node
+# Nombre de tours (une demande utilisateur et tout ce qui suit) gardés mot pour mot
+HISTORY_KEEP_TURNS = int(os.getenv("STELLA_HISTORY_KEEP_TURNS", 3))
+# Nombre de tours plus anciens gardés, mais avec les résultats d'outils remplacés par un court résumé
+HISTORY_STUB_TURNS = int(os.getenv("STELLA_HISTORY_STUB_TURNS", 3))
+# Au-delà, les tours sont condensés dans une "mémoire" glissante rédigée par le LLM
+HISTORY_SUMMARY_ENABLED = os.getenv("STELLA_HISTORY_SUMMARY", "1") == "1"
+# Taille (en caractères) à partir de laquelle un résultat d'outil est remplacé par un résumé
+HISTORY_STUB_MIN_CHARS = int(os.getenv("STELLA_HISTORY_STUB_MIN_CHARS", 200))
+# Longueur maximale d'un message dans le texte soumis au résumé
+SUMMARY_MESSAGE_MAX_CHARS = 500
+
+
+def estimate_tokens(messages: list) -> int:
+    """Estimation grossière du nombre de tokens (~4 caractères par token), sans tokenizer."""
+    n_chars = 0
+    for message in messages:
+        content = message.content if isinstance(message, BaseMessage) else message
+        n_chars += len(content) if isinstance(content, str) else len(str(content))
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            n_chars += len(tool_call["name"]) + len(str(tool_call["args"]))
+    return n_chars // 4
+
+
+def split_turns(messages: list) -> list:
+    """Découpe l'historique en tours : chaque HumanMessage ouvre un nouveau tour."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _tool_names(messages: list) -> dict:
+    """Associe chaque identifiant d'appel d'outil au nom de l'outil appelé."""
+    return {
+        tool_call["id"]: tool_call["name"]
+        for message in messages if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    }
+
+
+def stub_tool_outputs(messages: list) -> list:
+    """
+    Remplace les résultats d'outils volumineux (JSON d'actualités, de profil...) par une ligne.
+    Les ToolMessages sont conservés (même tool_call_id) pour rester appariés à leur appel.
+    """
+    names = _tool_names(messages)
+    stubbed = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) and len(message.content) > HISTORY_STUB_MIN_CHARS:
+            tool_name = names.get(message.tool_call_id, "inconnu")
+            message = ToolMessage(
+                tool_call_id=message.tool_call_id,
+                content=f"[Résultat de l'outil `{tool_name}` déjà affiché à l'utilisateur ({len(message.content)} caractères), omis de l'historique.]",
+            )
+        stubbed.append(message)
+    return stubbed
+
+
+def apply_history_policy(messages: list, keep_turns: int = HISTORY_KEEP_TURNS, stub_turns: int = HISTORY_STUB_TURNS):
+    """
+    Répartit l'historique en deux parties :
+    - `to_summarize` : les tours trop anciens, à condenser dans la mémoire glissante ;
+    - `window` : les `stub_turns` tours suivants (résultats d'outils résumés) puis les
+      `keep_turns` derniers tours, mot pour mot.
+    """
+    turns = split_turns(messages)
+    recent = turns[-keep_turns:] if keep_turns > 0 else []
+    older = turns[:len(turns) - len(recent)]
+    stubbed = older[-stub_turns:] if stub_turns > 0 else []
+    to_summarize = older[:len(older) - len(stubbed)]
+
+    window = stub_tool_outputs([m for turn in stubbed for m in turn]) + [m for turn in recent for m in turn]
+    return [m for turn in to_summarize for m in turn], window
+
+
+def render_for_summary(messages: list) -> str:
+    """Transcrit des messages en texte brut pour la demande de résumé."""
+    names = _tool_names(messages)
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        content = content.strip()[:SUMMARY_MESSAGE_MAX_CHARS]
+        if isinstance(message, HumanMessage):
+            lines.append(f"Utilisateur : {content}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Résultat de l'outil `{names.get(message.tool_call_id, 'inconnu')}` : {content}")
+        elif isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                lines.append(f"Stella appelle l'outil `{tool_call['name']}` avec {tool_call['args']}")
+            if content:
+                lines.append(f"Stella : {content}")
+    return "\n".join(lines)
+
+
+def build_summary_prompt(previous_summary: str, new_messages: list) -> str:
+    return f"""
+    Tu tiens la mémoire d'une conversation entre un utilisateur et Stella, une assistante d'analyse financière.
+    Voici le résumé actuel de la conversation (vide au début) :
+    {previous_summary or "(aucun)"}
+
+    Voici les nouveaux échanges à intégrer :
+    {render_for_summary(new_messages)}
+
+    Rédige le résumé mis à jour, en français, en 10 lignes maximum.
+    Conserve les entreprises et tickers étudiés, les analyses et verdicts obtenus, les graphiques affichés
+    et les préférences exprimées par l'utilisateur. Réponds uniquement avec le résumé.
+    """
+
+
+def summary_message(summary: str) -> SystemMessage:
+    """Message système portant la mémoire glissante des tours les plus anciens."""
+    return SystemMessage(content=f"--- MÉMOIRE DE LA CONVERSATION (échanges plus anciens, résumés) ---\n{summary}")
@@ -0,0 +1,129 @@
+# llm_cache.py
+
+import os
+import json
+import uuid
+import hashlib
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from src.cache import TTLDiskCache
+
+# Cache des réponses du LLM (appels déterministes à température 0)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+
+
+def _normalize_messages(prompt: str) -> list:
+    """
+    Réduit les messages sérialisés par LangChain à ce qui influence la réponse du LLM :
+    type, contenu, appels d'outils. Les identifiants (messages, appels d'outils) changent à
+    chaque tour : ils sont retirés, et les identifiants d'appels d'outils sont renumérotés
+    dans l'ordre d'apparition pour conserver le lien entre un appel et son résultat.
+    """
+    tool_call_ids = {}
+
+    def _tool_call_id(original_id):
+        return tool_call_ids.setdefault(original_id, f"call_{len(tool_call_ids)}")
+
+    normalized = []
+    for message in json.loads(prompt):
+        kwargs = message.get("kwargs", {})
+        content = kwargs.get("content", "")
+        item = {
+            "type": message.get("id", ["?"])[-1].replace("Chunk", ""),
+            "content": content.strip() if isinstance(content, str) else content,
+        }
+        if kwargs.get("tool_calls"):
+            item["tool_calls"] = [
+                {"name": call["name"], "args": call["args"], "id": _tool_call_id(call.get("id"))}
+                for call in kwargs["tool_calls"]
+            ]
+        if kwargs.get("tool_call_id"):
+            item["tool_call_id"] = _tool_call_id(kwargs["tool_call_id"])
+        if kwargs.get("name"):
+            item["name"] = kwargs["name"]
+        normalized.append(item)
+    return normalized
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Cache des réponses du LLM, branché via le paramètre `cache` du modèle LangChain.
+
+    La clé est un hash SHA-256 de la configuration du modèle (nom, température, schémas des
+    outils liés, fournis par LangChain dans `llm_string`) et des messages normalisés (prompt
+    système inclus). Les entrées sont stockées sur disque avec TTL et éviction LRU (TTLDiskCache).
+    À n'utiliser qu'avec un modèle à température 0 : les réponses y sont déterministes.
+    """
+
+    def __init__(self, ttl_seconds: float = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self._store = TTLDiskCache("llm", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        try:
+            messages = _normalize_messages(prompt)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            messages = prompt # Format inattendu : on hashe le prompt brut
+        payload = json.dumps({"llm": llm_string, "messages": messages}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        cached = self._store.get(self._key(prompt, llm_string))
+        with self._lock:
+            self._stats["hits" if cached is not None else "misses"] += 1
+        if cached is None:
+            return None
+
+        generations = []
+        for entry in cached:
+            # Identifiants neufs : un message (ou un appel d'outil) ne doit jamais être rejoué avec
+            # un identifiant déjà présent dans l'historique de la conversation.
+            tool_calls = [{**call, "id": f"call_{uuid.uuid4().hex[:24]}"} for call in entry["tool_calls"]]
+            message = AIMessage(
+                content=entry["content"],
+                tool_calls=tool_calls,
+                response_metadata={**entry["response_metadata"], "cache_hit": True},
+                id=f"run-{uuid.uuid4()}",
+            )
+            generations.append(ChatGeneration(message=message))
+        print(f"LLMCache: réponse servie depuis le cache ({len(generations)} génération(s)).")
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        entries = []
+        for generation in return_val:
+            message = getattr(generation, "message", None)
+            if not isinstance(message, AIMessage) or message.invalid_tool_calls:
+                return # Réponse incomplète ou mal formée : on ne la met pas en cache
+            entries.append({
+                "content": message.content,
+                "tool_calls": [{"name": call["name"], "args": call["args"]} for call in message.tool_calls],
+                "response_metadata": {
+                    k: v for k, v in message.response_metadata.items() if k in ("model_name", "finish_reason")
+                },
+            })
+        if entries:
+            self._store.set(self._key(prompt, llm_string), entries)
+
+    def clear(self, **kwargs) -> None:
+        self._store.clear()
+
+    def stats(self) -> dict:
+        """Taux de succès du cache et état du stockage (entrées, écritures, évictions)."""
+        store_stats = self._store.stats()
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats.update({k: store_stats[k] for k in ("entries", "writes", "evictions")})
+        return stats
+
+
+llm_cache = LLMResponseCache()
@@ -1,13 +1,14 @@
 # agent/pages/1_🎬 Visualisation de l'agent.py
 
 import streamlit as st
-import time
+import streamlit.components.v1 as components
+import json
 import os
 import sys
 
 # Astuce pour importer des modules depuis le répertoire parent (agent/)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from agent import generate_trace_animation_frames
+from agent import generate_trace_animation_frames, render_graph_svg, TRACE_GRAPH_STYLE
 
 # Configuration de la page
 st.set_page_config(layout="wide", page_title="Visualisation de l'agent")
@@ -20,111 +21,127 @@ if 'last_run_id' not in st.session_state:
     st.stop()
 
 # --- Initialisation de l'état de la session pour la visualisation ---
-# On va stocker les frames de l'animation pour ne pas les régénérer à chaque fois
+# On ne stocke que la description des étapes (quelques octets chacune), jamais d'images
 if 'animation_frames' not in st.session_state:
     st.session_state.animation_frames = []
-# On stocke l'index de l'étape actuelle
-if 'current_step' not in st.session_state:
-    st.session_state.current_step = 0
+
+# Hauteur du lecteur intégré (pixels)
+PLAYER_HEIGHT = 900
+
+# --- Lecteur côté navigateur ---
+# Le graphe est rendu une seule fois en SVG ; chaque étape se contente de changer le style
+# du noeud et de l'arête actifs. La lecture automatique tourne dans le navigateur : le
+# serveur Streamlit n'est pas bloqué.
+PLAYER_TEMPLATE = """
+<style>
+    body { font-family: Arial, sans-serif; color: #FAFAFA; margin: 0; }
+    .controls { display: flex; gap: 8px; align-items: center; margin-bottom: 12px; }
+    .controls button { background: #1C202D; color: #FAFAFA; border: 1px solid #6c757d; border-radius: 8px; padding: 6px 16px; font-size: 18px; cursor: pointer; }
+    .controls button:hover { border-color: __HIGHLIGHT__; }
+    .controls label { margin-left: 16px; font-size: 14px; }
+    #description { font-size: 22px; font-weight: bold; margin: 8px 0; }
+    #tools { font-family: monospace; font-size: 14px; color: __HIGHLIGHT__; min-height: 18px; }
+    #graph svg { width: 100%; height: auto; max-height: 760px; }
+    #graph .node.active path, #graph .node.active polygon { fill: __HIGHLIGHT__; stroke: __HIGHLIGHT__; }
+    #graph .edge.active path { stroke: __EDGE_HIGHLIGHT__; stroke-width: 2.5; }
+    #graph .edge.active polygon { fill: __EDGE_HIGHLIGHT__; stroke: __EDGE_HIGHLIGHT__; }
+</style>
+<div class="controls">
+    <button id="prev">⬅️</button>
+    <button id="play">▶️</button>
+    <button id="next">➡️</button>
+    <label>Vitesse (secondes par étape)
+        <input id="speed" type="range" min="0.25" max="3" step="0.25" value="1">
+        <span id="speed-value">1</span>s
+    </label>
+</div>
+<div id="description"></div>
+<div id="tools"></div>
+<div id="graph">__SVG__</div>
+<script>
+    const frames = __FRAMES__;
+    let current = 0;
+    let timer = null;
+
+    function show(index) {
+        current = Math.max(0, Math.min(index, frames.length - 1));
+        document.querySelectorAll("#graph .active").forEach(el => el.classList.remove("active"));
+        const frame = frames[current];
+        const node = document.getElementById(frame.node);
+        if (node) node.classList.add("active");
+        if (frame.edge) {
+            const edge = document.getElementById(frame.edge);
+            if (edge) edge.classList.add("active");
+        }
+        document.getElementById("description").textContent = `${frame.description} (Étape ${current + 1}/${frames.length})`;
+        document.getElementById("tools").textContent = frame.label || "";
+    }
+
+    function stop() {
+        clearInterval(timer);
+        timer = null;
+        document.getElementById("play").textContent = "▶️";
+    }
+
+    function play() {
+        if (timer) { stop(); return; }
+        if (current >= frames.length - 1) show(0);
+        document.getElementById("play").textContent = "⏸️";
+        const delay = parseFloat(document.getElementById("speed").value) * 1000;
+        timer = setInterval(() => {
+            if (current >= frames.length - 1) { stop(); return; }
+            show(current + 1);
+        }, delay);
+    }
+
+    document.getElementById("prev").onclick = () => { stop(); show(current - 1); };
+    document.getElementById("next").onclick = () => { stop(); show(current + 1); };
+    document.getElementById("play").onclick = play;
+    document.getElementById("speed").oninput = (e) => {
+        document.getElementById("speed-value").textContent = e.target.value;
+        if (timer) { stop(); play(); }
+    };
+    show(0);
+</script>
+"""
+
+def build_player_html(svg: str, frames: list) -> str:
+    highlight = TRACE_GRAPH_STYLE["highlight"]
+    return (PLAYER_TEMPLATE
+            .replace("__HIGHLIGHT__", highlight["fillcolor"])
+            .replace("__EDGE_HIGHLIGHT__", highlight["edge_color"])
+            .replace("__SVG__", svg[svg.find("<svg"):]) # Sans le prologue XML
+            .replace("__FRAMES__", json.dumps(frames).replace("</", "<\\/")))
 
 # --- Interface de contrôle ---
 st.subheader("Contrôles")
-# On utilise st.columns pour organiser les boutons
-col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 3])
+col1, col2 = st.columns([2, 5])
 
 with col1:
-    # Bouton pour charger la trace. Il sera désactivé une fois les frames chargées.
+    # Bouton pour charger la trace de la dernière exécution
     load_button = st.button(
-        "Charger la trace de l'exécution", 
-        use_container_width=True, 
-        type="primary",
-        disabled=bool(st.session_state.animation_frames) # Désactivé si les frames sont déjà là
-    )
-
-with col2:
-    # Bouton "Précédent"
-    prev_button = st.button("⬅️", use_container_width=True, disabled=not st.session_state.animation_frames)
-
-with col3:
-    # Bouton "Suivant"
-    next_button = st.button("➡️", use_container_width=True, disabled=not st.session_state.animation_frames)
-
-with col4:
-    # Bouton "Play" pour lancer l'animation automatique
-    play_button = st.button("▶️", use_container_width=True, disabled=not st.session_state.animation_frames)
-
-with col5:
-    # Slider pour la vitesse, utile pour le mode "Play"
-    speed = st.slider(
-        "Vitesse (secondes par étape)", 
-        min_value=0.25, 
-        max_value=3.0, 
-        value=1.0,
-        step=0.25
+        "Charger la trace de l'exécution",
+        use_container_width=True,
+        type="primary"
     )
 
 # --- Logique de chargement des données ---
 if load_button:
     last_run_id = st.session_state.last_run_id
-    with st.spinner("Récupération de la trace et génération des images..."):
+    with st.spinner("Récupération de la trace..."):
         frames = generate_trace_animation_frames(last_run_id)
-        if not frames:
-            st.error("Impossible de récupérer la trace ou de générer les images. Vérifiez les logs du terminal.")
-            st.session_state.animation_frames = []
-            st.session_state.current_step = 0
-        else:
-            st.success(f"Trace trouvée ! {len(frames)} étapes sont prêtes à être visualisées.")
-            st.session_state.animation_frames = frames
-            st.session_state.current_step = 0
-    # On rafraîchit la page pour activer les boutons de contrôle
-    st.rerun()
-
-# --- Logique de navigation manuelle ---
-if prev_button:
-    if st.session_state.current_step > 0:
-        st.session_state.current_step -= 1
-
-if next_button:
-    if st.session_state.current_step < len(st.session_state.animation_frames) - 1:
-        st.session_state.current_step += 1
-
-# --- Conteneurs pour l'affichage ---
-# On les définit ici pour qu'ils existent toujours
-description_placeholder = st.empty()
-image_placeholder = st.empty()
-
-# --- Affichage de l'étape actuelle ---
+    if not frames:
+        st.error("Impossible de récupérer la trace. Vérifiez les logs du terminal.")
+        st.session_state.animation_frames = []
+    else:
+        st.success(f"Trace trouvée ! {len(frames)} étapes sont prêtes à être visualisées.")
+        st.session_state.animation_frames = frames
+
+# --- Affichage du lecteur ---
 if st.session_state.animation_frames:
-    total_steps = len(st.session_state.animation_frames)
-    current_step_index = st.session_state.current_step
-    
-    # Récupérer la description et l'image pour l'étape actuelle
-    description, image_bytes = st.session_state.animation_frames[current_step_index]
-
-    # Afficher la description et le compteur d'étapes
-    description_placeholder.markdown(f"### {description} `(Étape {current_step_index + 1}/{total_steps})`")
-    
-    # Afficher l'image
-    image_placeholder.image(image_bytes, use_container_width=True)
-
-# --- Logique du mode "Play" (animation automatique) ---
-if play_button:
-    total_steps = len(st.session_state.animation_frames)
-    # On commence à l'étape actuelle pour pouvoir reprendre la lecture
-    start_step = st.session_state.current_step
-
-    for i in range(start_step, total_steps):
-        st.session_state.current_step = i
-        
-        description, image_bytes = st.session_state.animation_frames[i]
-        
-        # Mettre à jour les conteneurs
-        description_placeholder.markdown(f"### {description} `(Étape {i + 1}/{total_steps})`")
-        image_placeholder.image(image_bytes, use_container_width=True)
-        
-        # Attendre
-        time.sleep(speed)
-        
-    st.success("🎉 Animation terminée !")
-    # On remet l'index à la dernière étape après l'animation
-    st.session_state.current_step = total_steps - 1
\ No newline at end of file
+    try:
+        graph_svg = render_graph_svg()
+    except Exception as e:
+        st.error(f"Impossible de générer le graphe de l'agent (Graphviz est-il installé ?) : {e}")
+        st.stop()
+    components.html(build_player_html(graph_svg, st.session_state.animation_frames), height=PLAYER_HEIGHT, scrolling=True)
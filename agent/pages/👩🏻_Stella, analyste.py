@@ -4,14 +4,15 @@ import os
 import uuid
 import base64
 import pandas as pd
-import plotly.io as pio
-import plotly.graph_objects as go
 from io import StringIO
 import json
+import time
 import textwrap
 
 
-from agent import app
+from agent import app, STREAMED_NODES, INTERNAL_LLM_TAG
+from tracing import TraceRecorder
+from src.figure_codec import decode_figure
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 import base64
@@ -27,6 +28,10 @@ def get_image_as_base64(path):
     return base64.b64encode(data).decode()
 
 STELLA_AVATAR = "agent/assets/avatar_stella.png" # Chemin vers l'avatar de Stella
+# Intervalle minimal (secondes) entre deux rafraîchissements du texte streamé
+STREAM_RENDER_INTERVAL = float(os.getenv("STELLA_STREAM_RENDER_INTERVAL", 0.05))
+# Nombre de messages récents dont les artefacts décodés restent en session (les plus anciens sont redécodés)
+DECODED_ARTIFACTS_MAX_MESSAGES = int(os.getenv("STELLA_DECODED_ARTIFACTS_MAX_MESSAGES", 20))
 
 st.set_page_config(page_title="Assistant financier IA", page_icon="📈", layout="wide")
 st.title("📈 Analyste financier IA")
@@ -51,79 +56,120 @@ if "messages" not in st.session_state:
 if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 
+# --- Cache des artefacts décodés ---
+# Les JSON attachés aux messages (DataFrame, graphique, actualités, profil) ne sont décodés qu'une
+# seule fois par message : les reruns suivants réutilisent les objets gardés en session.
+# Seuls les DECODED_ARTIFACTS_MAX_MESSAGES derniers messages sont concernés, pour borner la mémoire
+# d'une longue conversation.
+def _decoded(msg_key: str, kind: str, raw: str, decoder):
+    cache = st.session_state.setdefault("decoded_artifacts", {})
+    if (msg_key, kind) in cache:
+        return cache[(msg_key, kind)]
+    value = decoder(raw)
+    if msg_key in st.session_state.get("decoded_message_keys", ()):
+        cache[(msg_key, kind)] = value
+    return value
+
+def _prune_decoded_artifacts(messages: list) -> None:
+    """Restreint le cache aux messages récents et oublie les artefacts des messages plus anciens."""
+    recent = [_message_key(msg, i) for i, msg in enumerate(messages)][-DECODED_ARTIFACTS_MAX_MESSAGES:]
+    st.session_state.decoded_message_keys = set(recent)
+    cache = st.session_state.setdefault("decoded_artifacts", {})
+    for key in [key for key in cache if key[0] not in st.session_state.decoded_message_keys]:
+        del cache[key]
+
+def _decode_dataframe(raw: str) -> pd.DataFrame:
+    return pd.read_json(StringIO(raw), orient='split')
+
+def _decode_figure(raw: str):
+    # Format compact (buffers typés, éventuellement compressés) ; plotly n'est importé qu'au décodage
+    return decode_figure(raw)
+
+def _message_key(msg, index: int) -> str:
+    """Identité stable d'un message (son id LangChain), utilisée pour le cache et les clés des widgets."""
+    return msg.id or f"msg_{index}"
+
+# Rendu d'un message de Stella. En fragment : une interaction avec un widget du message
+# (tableau, graphique) ne reconstruit que ce message, pas tout l'historique.
+@st.fragment
+def render_assistant_message(msg: AIMessage, msg_key: str):
+    st.markdown(msg.content)
+
+    # Logique pour le DataFrame 
+    if hasattr(msg, 'dataframe_json') and msg.dataframe_json:
+        try:
+            df = _decoded(msg_key, "dataframe", msg.dataframe_json, _decode_dataframe)
+            st.dataframe(df, key=f"df_{msg_key}")
+        except Exception as e:
+            st.error(f"Impossible d'afficher le DataFrame : {e}")
+
+    # --- Logique pour les graphiques Plotly ---
+    if hasattr(msg, 'plotly_json') and msg.plotly_json:
+        try:
+            fig = _decoded(msg_key, "figure", msg.plotly_json, _decode_figure)
+            st.plotly_chart(fig, use_container_width=True, key=f"chart_{msg_key}")
+        except Exception as e:
+            st.error(f"Impossible d'afficher le graphique : {e}")
+
+    # --- Logique pour le texte explicatif ---
+    if hasattr(msg, 'explanation_text') and msg.explanation_text:
+        st.markdown(msg.explanation_text)
+
+    # --- Logique pour le profil d'entreprise ---
+    if hasattr(msg, 'profile_json') and msg.profile_json:
+        try:
+            profile_data = _decoded(msg_key, "profile", msg.profile_json, json.loads)
+            if profile_data.get("image"):
+                # On peut afficher le logo à côté du titre pour un effet pro
+                st.image(profile_data["image"], width=60)
+        except Exception as e:
+            print(f"Erreur affichage logo: {e}")
+
+    # --- Logique pour les News ---
+    if hasattr(msg, 'news_json') and msg.news_json:
+        try:
+            news_articles = _decoded(msg_key, "news", msg.news_json, json.loads)
+            if not news_articles:
+                st.info("Je n'ai trouvé aucune actualité récente.")
+            else:
+                # On ajoute un peu d'espace avant les articles
+                st.write("---") 
+                
+                for article in news_articles:
+                    # On crée deux colonnes : une petite pour l'image, une grande pour le texte
+                    col1, col2 = st.columns([1, 4]) # Ratio 1:4
+
+                    with col1:
+                        # On affiche l'image si elle existe
+                        if article.get('image'):
+                            st.image(
+                                article['image'], 
+                                width=180, # On fixe une largeur pour que les images soient uniformes
+                                use_container_width='never' # Important pour respecter la largeur fixée
+                            )
+                        else:
+                            # Placeholder si pas d'image, pour garder l'alignement
+                            st.text(" ") 
+
+                    with col2:
+                        # On affiche le titre, la source et le lien
+                        st.markdown(f"**{article['title']}**")
+                        st.caption(f"Source : {article.get('site', 'N/A')}")
+                        st.markdown(f"<small><a href='{article['url']}' target='_blank'>Lire l'article</a></small>", unsafe_allow_html=True)
+                    
+                    # On ajoute un séparateur horizontal entre chaque article pour la clarté
+                    st.divider()
+
+        except Exception as e:
+            st.error(f"Impossible d'afficher les actualités : {e}")
+
+
 # --- Affichage des messages existant depuis l'historique---
+_prune_decoded_artifacts(st.session_state.messages)
 for i, msg in enumerate(st.session_state.messages):
     if isinstance(msg, AIMessage):
         with st.chat_message("assistant", avatar=STELLA_AVATAR):
-            st.markdown(msg.content)
-
-            # Logique pour le DataFrame 
-            if hasattr(msg, 'dataframe_json') and msg.dataframe_json:
-                try:
-                    df = pd.read_json(StringIO(msg.dataframe_json), orient='split')
-                    st.dataframe(df, key=f"df_{i}") 
-                except Exception as e:
-                    st.error(f"Impossible d'afficher le DataFrame : {e}")
-
-            # --- Logique pour les graphiques Plotly ---
-            if hasattr(msg, 'plotly_json') and msg.plotly_json:
-                try:
-                    fig = go.Figure(pio.from_json(msg.plotly_json))
-                    st.plotly_chart(fig, use_container_width=True, key=f"df_{i}")
-                except Exception as e:
-                    st.error(f"Impossible d'afficher le graphique : {e}")
-
-            # --- Logique pour le texte explicatif ---
-            if hasattr(msg, 'explanation_text') and msg.explanation_text:
-                st.markdown(msg.explanation_text)
-
-            # --- Logique pour le profil d'entreprise ---
-            if hasattr(msg, 'profile_json') and msg.profile_json:
-                try:
-                    profile_data = json.loads(msg.profile_json)
-                    if profile_data.get("image"):
-                        # On peut afficher le logo à côté du titre pour un effet pro
-                        st.image(profile_data["image"], width=60)
-                except Exception as e:
-                    print(f"Erreur affichage logo: {e}")
-
-            # --- Logique pour les News ---
-            if hasattr(msg, 'news_json') and msg.news_json:
-                try:
-                    news_articles = json.loads(msg.news_json)
-                    if not news_articles:
-                        st.info("Je n'ai trouvé aucune actualité récente.")
-                    else:
-                        # On ajoute un peu d'espace avant les articles
-                        st.write("---") 
-                        
-                        for article in news_articles:
-                            # On crée deux colonnes : une petite pour l'image, une grande pour le texte
-                            col1, col2 = st.columns([1, 4]) # Ratio 1:4
-
-                            with col1:
-                                # On affiche l'image si elle existe
-                                if article.get('image'):
-                                    st.image(
-                                        article['image'], 
-                                        width=180, # On fixe une largeur pour que les images soient uniformes
-                                        use_container_width='never' # Important pour respecter la largeur fixée
-                                    )
-                                else:
-                                    # Placeholder si pas d'image, pour garder l'alignement
-                                    st.text(" ") 
-
-                            with col2:
-                                # On affiche le titre, la source et le lien
-                                st.markdown(f"**{article['title']}**")
-                                st.caption(f"Source : {article.get('site', 'N/A')}")
-                                st.markdown(f"<small><a href='{article['url']}' target='_blank'>Lire l'article</a></small>", unsafe_allow_html=True)
-                            
-                            # On ajoute un séparateur horizontal entre chaque article pour la clarté
-                            st.divider()
-
-                except Exception as e:
-                    st.error(f"Impossible d'afficher les actualités : {e}")
+            render_assistant_message(msg, _message_key(msg, i))
 
     elif isinstance(msg, HumanMessage):
         with st.chat_message("user"):
@@ -138,15 +184,44 @@ if prompt := st.chat_input("Qu'est ce que je peux faire pour toi aujourd'hui ? 
     with st.chat_message("assistant", avatar=STELLA_AVATAR):
         thinking_placeholder = st.empty()
         thinking_placeholder.write("🧠 Hmm, laisse-moi réfléchir une seconde...")
+        # Zone où la réponse s'affiche au fil des tokens
+        stream_placeholder = st.empty()
+        streamed_message_id = None
+        streamed_text = ""
+        last_render = 0.0
 
         inputs = {"messages": st.session_state.messages}
-        config = {"configurable": {"thread_id": st.session_state.session_id}}
+        # Le TraceRecorder enregistre localement le chemin suivi dans le graphe (page de visualisation)
+        config = {
+            "configurable": {"thread_id": st.session_state.session_id},
+            "callbacks": [TraceRecorder(st.session_state.session_id)],
+        }
         
         final_response = None
         
         try:
-            # On streame les events pour afficher les étapes en temps réel
-            for event in app.stream(inputs, config=config, stream_mode="values"):
+            # On streame à la fois l'état (étapes) et les tokens du LLM (réponse en cours de rédaction)
+            for stream_mode, payload in app.stream(inputs, config=config, stream_mode=["values", "messages"]):
+                if stream_mode == "messages":
+                    chunk, metadata = payload
+                    if metadata.get("langgraph_node") not in STREAMED_NODES or INTERNAL_LLM_TAG in metadata.get("tags", []):
+                        continue
+                    # Une réponse servie par le cache du LLM arrive d'un bloc (AIMessage au lieu de chunks)
+                    if not isinstance(chunk, AIMessage) or not isinstance(chunk.content, str) or not chunk.content:
+                        continue
+                    # Nouveau message : on repart d'une zone vide
+                    if chunk.id != streamed_message_id:
+                        streamed_message_id = chunk.id
+                        streamed_text = ""
+                    streamed_text += chunk.content
+                    now = time.monotonic()
+                    if now - last_render >= STREAM_RENDER_INTERVAL:
+                        thinking_placeholder.empty()
+                        stream_placeholder.markdown(streamed_text + "▌")
+                        last_render = now
+                    continue
+
+                event = payload
                 last_message = event["messages"][-1]
                 
                 # On vérifie si l'IA a décidé d'appeler un outil
@@ -160,6 +235,10 @@ if prompt := st.chat_input("Qu'est ce que je peux faire pour toi aujourd'hui ? 
                         company_name = tool_args.get('company_name', 'l\'entreprise demandée')
                         thinking_placeholder.write(f"🔍 Parfait, je commence par chercher l'identifiant boursier pour **{company_name}**...")
                     
+                    elif tool_name == 'full_analysis':
+                        target = tool_args.get('ticker') or tool_args.get('company_name', 'l\'action')
+                        thinking_placeholder.write(f"🔮 Je lance l'analyse complète de `{target.upper()}` : données, nettoyage et évaluation des risques...")
+
                     elif tool_name == 'get_company_profile':
                         ticker = tool_args.get('ticker', 'l\'action')
                         thinking_placeholder.write(f"ℹ️ D'accord, je rassemble les informations générales (secteur, activité...) pour `{ticker.upper()}`.")
@@ -203,9 +282,13 @@ if prompt := st.chat_input("Qu'est ce que je peux faire pour toi aujourd'hui ? 
                     final_response = last_message
 
             thinking_placeholder.empty()
+            stream_placeholder.empty()
 
             if final_response:
                 st.session_state.messages.append(final_response)
+                _prune_decoded_artifacts(st.session_state.messages)
+                # La réponse est affichée directement dans la bulle en cours, sans recharger la page
+                render_assistant_message(final_response, _message_key(final_response, len(st.session_state.messages) - 1))
 
                 # On enregistre l'ID de cette conversation pour que la page de visualisation puisse l'utiliser
                 st.session_state.last_run_id = st.session_state.session_id
@@ -213,14 +296,13 @@ if prompt := st.chat_input("Qu'est ce que je peux faire pour toi aujourd'hui ? 
             else:
                 fallback_response = AIMessage(content="Désolée, je semble avoir rencontré une erreur en cours de route. Peux-tu réessayer ou reformuler ta demande ?")
                 st.session_state.messages.append(fallback_response)
+                st.markdown(fallback_response.content)
         
         except Exception as e:
             thinking_placeholder.empty()
+            stream_placeholder.empty()
             error_msg = f"Oups ! Une erreur inattendue et un peu technique s'est produite. Voici le détail pour les curieux : {e}"
             st.error(error_msg)
             st.session_state.messages.append(AIMessage(content=error_msg))
             import traceback
             traceback.print_exc()
-
-        # Rafraîchit la page pour afficher le nouveau message ajouté à l'historique
-        st.rerun()
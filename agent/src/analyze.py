@@ -3,11 +3,180 @@
 import pandas as pd
 import joblib
 import os
+import time
+import threading
 import numpy as np # Assurez-vous que numpy est importé
+from .fast_forest import FlatForest, verification_sample
 
 # Le chemin vers votre modèle
 MODEL_PATH = 'models/rf_fundamental_market_classifier.joblib' 
 
+# Moteur d'inférence à plat (src/fast_forest.py) : activable/désactivable, et réservé aux petits lots
+# où il est plus rapide que sklearn (voir le micro-benchmark du module).
+FAST_INFERENCE_ENABLED = os.getenv("STELLA_FAST_INFERENCE", "1") == "1"
+FAST_INFERENCE_MAX_ROWS = int(os.getenv("STELLA_FAST_INFERENCE_MAX_ROWS", 1000))
+
+# Les features attendues par le modèle, dans l'ordre d'entraînement
+FEATURE_COLUMNS = ['marketCap', 'marginProfit', 'roe', 'roic', 'revenuePerShare', 'debtToEquity', 'revenuePerShare_YoY_Growth', 'earningsYield']
+
+
+class RiskModelHolder:
+    """
+    Détient le modèle de risque pour tout le processus.
+    Le modèle est chargé une seule fois (à la première utilisation), "préchauffé" par une
+    prédiction factice, puis rechargé uniquement si le fichier de l'artefact change sur disque.
+    """
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._lock = threading.Lock()
+        self._model = None
+        self._engine = None
+        self._metadata = {}
+
+    def _load(self) -> None:
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Modèle non trouvé à l'emplacement : {self.model_path}")
+        print("Chargement du modèle de prédiction...")
+        start = time.perf_counter()
+        mtime = os.path.getmtime(self.model_path)
+        model = joblib.load(self.model_path)
+        load_seconds = time.perf_counter() - start
+
+        # Préchauffage : la première prédiction initialise les structures internes de sklearn
+        feature_names = [str(name) for name in getattr(model, "feature_names_in_", FEATURE_COLUMNS)]
+        model.predict_proba(pd.DataFrame([np.zeros(len(feature_names))], columns=feature_names))
+
+        self._model = model
+        self._engine = self._build_engine(model) if FAST_INFERENCE_ENABLED else None
+        self._metadata = {
+            "model_path": self.model_path,
+            "model_class": type(model).__name__,
+            "feature_names": feature_names,
+            "n_estimators": getattr(model, "n_estimators", None),
+            "classes": [int(c) for c in getattr(model, "classes_", [])],
+            "file_mtime": mtime,
+            "loaded_at": time.time(),
+            "load_seconds": load_seconds,
+            "fast_inference": self._engine is not None,
+        }
+        print(f"Modèle chargé en {load_seconds:.3f}s ({self._metadata['n_estimators']} arbres).")
+
+    @staticmethod
+    def _build_engine(model):
+        """Construit le moteur à plat et ne le garde que s'il reproduit sklearn au bit près."""
+        try:
+            engine = FlatForest(model)
+            if engine.verify(model, verification_sample(engine)):
+                return engine
+            print("Avertissement: le moteur d'inférence à plat diverge de sklearn, il est désactivé.")
+        except Exception as e:
+            print(f"Avertissement: moteur d'inférence à plat indisponible pour ce modèle : {e}")
+        return None
+
+    def _artifact_changed(self) -> bool:
+        try:
+            return os.path.getmtime(self.model_path) != self._metadata.get("file_mtime")
+        except OSError:
+            return False # Fichier momentanément absent : on garde le modèle déjà en mémoire
+
+    def get(self):
+        """Renvoie le modèle, en le chargeant au premier appel ou si l'artefact a changé."""
+        if self._model is None or self._artifact_changed():
+            with self._lock:
+                if self._model is None or self._artifact_changed():
+                    self._load()
+        return self._model
+
+    def get_engine(self):
+        """Renvoie le moteur d'inférence à plat du modèle courant, ou None s'il n'est pas disponible."""
+        self.get()
+        return self._engine
+
+    def reload(self):
+        """Force le rechargement du modèle depuis le disque."""
+        with self._lock:
+            self._load()
+        return self._model
+
+    @property
+    def metadata(self) -> dict:
+        """Métadonnées du modèle chargé (features, nombre d'arbres, date et durée de chargement)."""
+        return dict(self._metadata)
+
+
+risk_model = RiskModelHolder(MODEL_PATH)
+
+# Règle métier : un risque élevé est signalé si la classe 0 est prédite avec plus de 70% de confiance
+RISK_CONFIDENCE_THRESHOLD = 0.7
+HIGH_RISK_VERDICT = "Risque Élevé Détecté"
+NO_EXTREME_RISK_VERDICT = "Aucun Risque Extrême Détecté"
+
+def _prepare_features(processed_data: pd.DataFrame) -> pd.DataFrame:
+    """Remet les colonnes dans l'ordre du modèle et vérifie qu'il n'y a ni données vides ni valeurs nulles."""
+    expected_cols = FEATURE_COLUMNS + ['calendarYear']
+    
+    # S'assure que les colonnes sont dans le bon ordre et que les manquantes sont remplies (avec 0 par ex.)
+    data_for_prediction = processed_data.reindex(columns=expected_cols, fill_value=0)
+    data_for_prediction = data_for_prediction.drop(columns=['calendarYear'], errors='ignore')  # On ne prédit pas sur l'année
+    
+    if data_for_prediction.empty or data_for_prediction.isnull().values.any():
+        raise ValueError("Les données fournies sont vides ou contiennent des valeurs nulles après le reformatage.")
+    return data_for_prediction
+
+def build_feature_matrix(processed_by_ticker: dict) -> pd.DataFrame:
+    """
+    Empile la ligne la plus récente des données prétraitées de plusieurs tickers.
+
+    Args:
+        processed_by_ticker (dict): {ticker: DataFrame prétraité par preprocess_financial_data}.
+
+    Returns:
+        pd.DataFrame: Une ligne par ticker (index = ticker), colonnes dans l'ordre du modèle.
+    """
+    latest_rows = []
+    for ticker, processed_df in processed_by_ticker.items():
+        latest_row = processed_df.tail(1).copy()
+        latest_row.index = [ticker.upper()]
+        latest_rows.append(latest_row)
+    if not latest_rows:
+        raise ValueError("Aucune donnée fournie pour construire la matrice de features.")
+    return _prepare_features(pd.concat(latest_rows))
+
+def analyse_risks_batch(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Évalue le risque de sous-performance de plusieurs lignes en un seul appel au modèle.
+    La classe prédite est déduite des probabilités (argmax), comme le fait `predict` de sklearn,
+    ce qui évite un second passage dans la forêt.
+
+    Args:
+        features (pd.DataFrame): Une ligne par action (ex: sortie de build_feature_matrix).
+
+    Returns:
+        pd.DataFrame: Même index que `features`, avec les colonnes 'predicted_class',
+                      'proba_class_0', 'high_risk' (décision seuillée) et 'verdict'.
+    """
+    model = risk_model.get()
+    data_for_prediction = _prepare_features(features)
+
+    # Un seul passage vectorisé dans le modèle pour toutes les lignes
+    engine = risk_model.get_engine()
+    if engine is not None and len(data_for_prediction) <= FAST_INFERENCE_MAX_ROWS:
+        probabilities = engine.predict_proba(data_for_prediction)
+    else:
+        probabilities = model.predict_proba(data_for_prediction)
+    classes = np.asarray(model.classes_)
+    predicted_class = classes[np.argmax(probabilities, axis=1)]
+    proba_class_0 = probabilities[:, list(classes).index(0)]
+
+    high_risk = (predicted_class == 0) & (proba_class_0 > RISK_CONFIDENCE_THRESHOLD)
+    return pd.DataFrame({
+        "predicted_class": predicted_class,
+        "proba_class_0": proba_class_0,
+        "high_risk": high_risk,
+        "verdict": np.where(high_risk, HIGH_RISK_VERDICT, NO_EXTREME_RISK_VERDICT),
+    }, index=data_for_prediction.index)
+
 def analyse_risks(processed_data: pd.DataFrame) -> str:
     """
     Analyse les données pour détecter un risque de sous-performance.
@@ -18,42 +187,21 @@ def analyse_risks(processed_data: pd.DataFrame) -> str:
         - "Risque Élevé Détecté": Si la prédiction est '0' avec une confiance > 0.7.
         - "Aucun Risque Extrême Détecté": Dans tous les autres cas.
     """
-    print("Chargement du modèle de prédiction...")
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Modèle non trouvé à l'emplacement : {MODEL_PATH}")
-    model = joblib.load(MODEL_PATH)
-    
     print("Préparation des données pour la prédiction...")
-
-    expected_cols = ['marketCap', 'marginProfit', 'roe', 'roic', 'revenuePerShare', 'debtToEquity', 'revenuePerShare_YoY_Growth', 'earningsYield', 'calendarYear']
-    
-    # S'assure que les colonnes sont dans le bon ordre et que les manquantes sont remplies (avec 0 par ex.)
-    data_for_prediction = processed_data.reindex(columns=expected_cols, fill_value=0)
-    data_for_prediction = data_for_prediction.drop(columns=['calendarYear'], errors='ignore')  # On ne prédit pas sur l'année
-    
-    if data_for_prediction.empty or data_for_prediction.isnull().values.any():
-        raise ValueError("Les données fournies sont vides ou contiennent des valeurs nulles après le reformatage.")
+    data_for_prediction = _prepare_features(processed_data)
     
     print("Exécution de la prédiction...")
     # On prédit sur la dernière ligne disponible (la plus récente)
     latest_data_point = data_for_prediction.tail(1)
-
-    # Obtenir la classe prédite (0 ou 1)
-    prediction_class = model.predict(latest_data_point)[0]
-    # Obtenir les probabilités [prob_classe_0, prob_classe_1]
-    probabilities = model.predict_proba(latest_data_point)[0]
-    
-    # Notre règle métier spécifique
-    confidence_in_class_0 = probabilities[0]
+    scores = analyse_risks_batch(latest_data_point).iloc[0]
     
-    print(f"Classe prédite: {prediction_class}, Probabilités: [Classe 0: {probabilities[0]:.2f}, Classe 1: {probabilities[1]:.2f}]")
+    print(f"Classe prédite: {scores['predicted_class']}, Probabilités: [Classe 0: {scores['proba_class_0']:.2f}, Classe 1: {1 - scores['proba_class_0']:.2f}]")
 
     # Appliquer la logique de décision
-    if prediction_class == 0 and confidence_in_class_0 > 0.7:
-        result = "Risque Élevé Détecté"
+    result = scores['verdict']
+    if scores['high_risk']:
         print(f"VERDICT: {result} (Confiance dans la classe 0 > 70%)")
     else:
-        result = "Aucun Risque Extrême Détecté"
         print(f"VERDICT: {result} (La condition de risque élevé n'est pas remplie)")
         
     return result
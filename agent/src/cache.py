@@ -0,0 +1,173 @@
+# src/cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from .rate_limit import request_lane, BACKGROUND
+
+# Dossier racine de tous les caches locaux de Stella (surchargeable par variable d'environnement)
+CACHE_DIR = os.getenv("STELLA_CACHE_DIR", os.path.join(".cache", "stella"))
+
+
+class TTLDiskCache:
+    """
+    Cache clé/valeur persistant sur disque, avec durée de vie (TTL), éviction LRU bornée
+    et sémantique "stale-while-revalidate".
+
+    Chaque entrée est un fichier JSON (la valeur doit donc être sérialisable en JSON).
+    - Une entrée plus jeune que `ttl_seconds` est "fraîche" et renvoyée telle quelle.
+    - Une entrée expirée depuis moins de `stale_seconds` est "périmée" : elle est renvoyée
+      immédiatement et rafraîchie en tâche de fond.
+    - Au-delà, l'entrée est ignorée et la valeur est récupérée de manière synchrone.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, stale_seconds: float = 0, max_entries: int = 512, directory: str = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.directory = directory or os.path.join(CACHE_DIR, name)
+        self._lock = threading.Lock()
+        self._refreshing = set() # Clés en cours de rafraîchissement en tâche de fond
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "writes": 0, "evictions": 0, "refresh_errors": 0}
+
+    # --- Accès bas niveau ---
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, key: str):
+        """Renvoie (valeur, âge en secondes) ou None si l'entrée n'existe pas ou est illisible."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        # On "touche" le fichier pour que l'éviction se fasse dans l'ordre du dernier accès (LRU)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry["value"], time.time() - entry["stored_at"]
+
+    def set(self, key: str, value) -> None:
+        """Enregistre une valeur (écriture atomique) puis applique la limite de taille."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "stored_at": time.time(), "value": value}, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats["writes"] += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de `max_entries`."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+                with self._lock:
+                    self._stats["evictions"] += 1
+            except OSError:
+                pass
+
+    def get(self, key: str, allow_expired: bool = False):
+        """
+        Renvoie la valeur si elle est fraîche (ou périmée mais dans la fenêtre `stale_seconds`),
+        None sinon. Avec `allow_expired=True`, renvoie n'importe quelle valeur encore sur disque.
+        """
+        found = self._read(key)
+        if found is None:
+            return None
+        value, age = found
+        if allow_expired or age <= self.ttl_seconds + self.stale_seconds:
+            return value
+        return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Vide entièrement le cache."""
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+    # --- Accès haut niveau ---
+    def get_or_fetch(self, key: str, fetch_fn):
+        """
+        Renvoie la valeur associée à `key` en appelant `fetch_fn()` seulement si nécessaire.
+        Les erreurs de `fetch_fn` ne sont jamais mises en cache.
+        """
+        found = self._read(key)
+        if found is not None:
+            value, age = found
+            if age <= self.ttl_seconds:
+                with self._lock:
+                    self._stats["hits"] += 1
+                return value
+            if age <= self.ttl_seconds + self.stale_seconds:
+                with self._lock:
+                    self._stats["stale_hits"] += 1
+                self._refresh_in_background(key, fetch_fn)
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        value = fetch_fn()
+        self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: str, fetch_fn) -> None:
+        """Lance un seul rafraîchissement par clé dans un thread séparé."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _refresh():
+            try:
+                # Voie de fond : les requêtes des sessions passent avant ce rafraîchissement
+                with request_lane(BACKGROUND):
+                    self.set(key, fetch_fn())
+            except Exception as e:
+                with self._lock:
+                    self._stats["refresh_errors"] += 1
+                print(f"Cache '{self.name}': échec du rafraîchissement de '{key}' : {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_refresh, name=f"cache-refresh-{self.name}", daemon=True).start()
+
+    def stats(self) -> dict:
+        """Compteurs d'utilisation du cache, utiles pour le dimensionner."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        try:
+            stats["entries"] = sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json"))
+        except OSError:
+            stats["entries"] = 0
+        return stats
@@ -1,49 +1,98 @@
 # agent/src/compare_fundamentals.py
 
+import os
+import math
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # On importe les logiques existantes pour les réutiliser
 from .fetch_data import fetch_fundamental_data
 from .preprocess import preprocess_financial_data
 
+# Nombre maximal de tickers traités en parallèle, et délai maximal accordé à chacun (secondes),
+# compté à partir du début de son traitement
+COMPARE_MAX_WORKERS = int(os.getenv("COMPARE_MAX_WORKERS", 8))
+COMPARE_TICKER_TIMEOUT = float(os.getenv("COMPARE_TICKER_TIMEOUT", 30))
+
+def _fetch_metric_series(ticker: str, metric: str) -> pd.Series:
+    """Récupère et prétraite les données d'un ticker, puis renvoie l'évolution de la métrique."""
+    print(f"Comparaison (Évolution): Récupération des données pour {ticker}...")
+    raw_df = fetch_fundamental_data(ticker)
+    processed_df = preprocess_financial_data(raw_df)
+
+    # On vérifie que les colonnes nécessaires sont présentes
+    if metric not in processed_df.columns or 'calendarYear' not in processed_df.columns:
+        print(f"Avertissement: Données insuffisantes pour '{metric}' chez {ticker}.")
+        return None
+
+    # On sélectionne l'évolution de la métrique pour ce ticker
+    metric_series = processed_df.set_index('calendarYear')[metric]
+    metric_series.name = ticker.upper() # Le nom de la série devient le ticker
+    return metric_series
+
 def compare_fundamental_metrics(tickers: list[str], metric: str) -> pd.DataFrame:
     """
     Récupère l'historique d'une métrique fondamentale pour plusieurs tickers
     et les combine dans un seul DataFrame pour une comparaison temporelle.
-    
+    Les tickers sont récupérés en parallèle ; ceux en erreur ou trop lents sont ignorés.
+
     Returns:
         pd.DataFrame: Un DataFrame où l'index est 'calendarYear' et chaque colonne
                       est un ticker, contenant les valeurs de la métrique.
     """
-    all_metrics_series = []
-    
-    for ticker in tickers:
-        try:
-            print(f"Comparaison (Évolution): Récupération des données pour {ticker}...")
-            raw_df = fetch_fundamental_data(ticker)
-            processed_df = preprocess_financial_data(raw_df)
-            
-            # On vérifie que les colonnes nécessaires sont présentes
-            if metric not in processed_df.columns or 'calendarYear' not in processed_df.columns:
-                print(f"Avertissement: Données insuffisantes pour '{metric}' chez {ticker}.")
-                continue
-            
-            # On sélectionne l'évolution de la métrique pour ce ticker
-            metric_series = processed_df.set_index('calendarYear')[metric]
-            metric_series.name = ticker.upper() # Le nom de la série devient le ticker
-            
-            all_metrics_series.append(metric_series)
-
-        except Exception as e:
-            print(f"Erreur lors du traitement de {ticker} pour la comparaison d'évolution: {e}")
-            continue
-            
+    if not tickers:
+        raise ValueError(f"Impossible de récupérer l'historique de la métrique '{metric}' pour les tickers fournis.")
+
+    max_workers = min(COMPARE_MAX_WORKERS, len(tickers))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compare-fundamentals")
+
+    # Chaque ticker dispose de COMPARE_TICKER_TIMEOUT secondes à partir du moment où un worker le prend
+    started_at = {}
+    def _run(position: int, ticker: str):
+        started_at[position] = time.monotonic()
+        return _fetch_metric_series(ticker, metric)
+
+    pending = {executor.submit(_run, position, ticker): position for position, ticker in enumerate(tickers)}
+    # Un ticker encore en file (workers bloqués par des appels qui n'ont jamais répondu) n'attend pas indéfiniment
+    queue_deadline = time.monotonic() + COMPARE_TICKER_TIMEOUT * math.ceil(len(tickers) / max_workers)
+    results = {}
+    try:
+        while pending:
+            now = time.monotonic()
+            for future, position in list(pending.items()):
+                start = started_at.get(position)
+                expired = now - start >= COMPARE_TICKER_TIMEOUT if start is not None else now >= queue_deadline
+                if expired and not future.done():
+                    print(f"Avertissement: Délai dépassé pour {tickers[position]}, il est ignoré dans la comparaison d'évolution.")
+                    future.cancel()
+                    del pending[future]
+            if not pending:
+                break
+
+            # On se réveille au premier résultat ou à la prochaine échéance
+            deadlines = [started_at[p] + COMPARE_TICKER_TIMEOUT for p in pending.values() if p in started_at]
+            next_deadline = min(deadlines + [queue_deadline])
+            done, _ = wait(pending, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                position = pending.pop(future)
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    print(f"Erreur lors du traitement de {tickers[position]} pour la comparaison d'évolution: {e}")
+    finally:
+        # On n'attend pas les éventuels appels encore bloqués : ils se termineront en arrière-plan
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Ordre des tickers demandés, pour garder un ordre de colonnes stable
+    all_metrics_series = [results[p] for p in sorted(results) if results[p] is not None]
+
     if not all_metrics_series:
         raise ValueError(f"Impossible de récupérer l'historique de la métrique '{metric}' pour les tickers fournis.")
-        
+
     # On combine toutes les séries en un seul DataFrame
     # L'index (calendarYear) permet d'aligner les données automatiquement
     combined_df = pd.concat(all_metrics_series, axis=1)
-    
+
     # On peut trier par l'index (années) pour s'assurer de l'ordre
-    return combined_df.sort_index()
\ No newline at end of file
+    return combined_df.sort_index()
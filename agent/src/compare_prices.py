@@ -1,35 +1,31 @@
 # agent/src/compare_prices.py
 
 import pandas as pd
-from .fetch_price import fetch_price_history
+from .fetch_price import fetch_price_histories
 
 def compare_price_histories(tickers: list[str], period_days: int = 252) -> pd.DataFrame:
     """
     Récupère et normalise les historiques de prix pour plusieurs tickers afin de les comparer.
+    Tous les tickers (y compris les indices ajoutés en suivi, ex: QQQ, SPY) sont récupérés
+    en un seul téléchargement.
     La normalisation est essentielle pour comparer sur une base de 100.
     """
-    all_normalized_prices = []
-    
-    for ticker in tickers:
-        try:
-            print(f"Comparaison de prix: Récupération pour {ticker}...")
-            price_df = fetch_price_history(ticker, period_days)
-            
-            # Normalisation : (prix actuel / premier prix) * 100
-            normalized_price = (price_df['close'] / price_df['close'].iloc[0]) * 100
-            normalized_price.name = ticker.upper() # On renomme la série avec le nom du ticker
-            all_normalized_prices.append(normalized_price)
-            
-        except Exception as e:
-            print(f"Erreur lors de la récupération des prix pour {ticker}: {e}")
-            continue
-    
-    if not all_normalized_prices:
+    print(f"Comparaison de prix: Récupération groupée pour {tickers}...")
+    try:
+        closes = fetch_price_histories(tickers, period_days)
+    except Exception as e:
+        print(f"Erreur lors de la récupération des prix pour {tickers}: {e}")
+        closes = pd.DataFrame()
+
+    if closes.empty or closes.shape[1] == 0:
         raise ValueError("Impossible de récupérer les données de prix pour la comparaison.")
-    
-    # Concatène toutes les séries normalisées en un seul DataFrame
-    combined_df = pd.concat(all_normalized_prices, axis=1)
+
+    # Normalisation : (prix actuel / premier prix disponible) * 100, ticker par ticker,
+    # car les dates de première cotation peuvent différer d'une place boursière à l'autre.
+    first_prices = closes.apply(lambda column: column.dropna().iloc[0])
+    combined_df = (closes / first_prices) * 100
+
     # Remplit les valeurs manquantes (si les jours de bourse diffèrent)
-    combined_df = combined_df.fillna(method='ffill')
-    
-    return combined_df
\ No newline at end of file
+    combined_df = combined_df.ffill()
+
+    return combined_df
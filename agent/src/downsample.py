@@ -0,0 +1,76 @@
+# src/downsample.py
+
+import os
+import numpy as np
+import pandas as pd
+
+# Nombre maximal de points conservés par courbe dans les graphiques de prix
+CHART_MAX_POINTS = int(os.getenv("STELLA_CHART_MAX_POINTS", 500))
+# Au-delà de ce nombre total de points dessinés (toutes courbes, après sous-échantillonnage),
+# on passe en rendu WebGL (Scattergl). Chaque graphique WebGL occupe un contexte du navigateur, en nombre limité.
+CHART_WEBGL_THRESHOLD = int(os.getenv("STELLA_CHART_WEBGL_THRESHOLD", 1000))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Sous-échantillonnage "Largest-Triangle-Three-Buckets" : renvoie les positions des `n_out`
+    points qui préservent le mieux la forme visuelle de la courbe (pics et creux compris).
+    Le premier et le dernier point sont toujours conservés.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 seaux entre le premier et le dernier point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    indices = np.empty(n_out, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Point moyen du seau suivant (le dernier point pour le dernier seau)
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # On garde le point du seau qui forme le plus grand triangle avec le point précédent et ce point moyen
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected]) - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def downsample_frame(df: pd.DataFrame, max_points: int = CHART_MAX_POINTS) -> pd.DataFrame:
+    """
+    Réduit un DataFrame large (une colonne par courbe, index = dates) à environ `max_points`
+    lignes par courbe avec LTTB. Les lignes retenues pour chaque courbe sont réunies, afin que
+    toutes les courbes gardent leurs points remarquables sur un index commun.
+    """
+    if len(df) <= max_points:
+        return df
+
+    if isinstance(df.index, pd.DatetimeIndex):
+        x = df.index.asi8.astype(np.float64)
+    else:
+        x = np.arange(len(df), dtype=np.float64)
+
+    keep = np.zeros(len(df), dtype=bool)
+    for column in df.columns:
+        y = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(y))
+        if len(valid) == 0:
+            continue
+        keep[valid[lttb_indices(x[valid], y[valid], max_points)]] = True
+
+    downsampled = df.iloc[np.flatnonzero(keep)]
+    print(f"Graphique: sous-échantillonnage de {len(df)} à {len(downsampled)} points par courbe.")
+    return downsampled
+
+
+def chart_render_mode(df: pd.DataFrame) -> str:
+    """
+    Mode de rendu plotly express : 'webgl' (Scattergl) si le graphique dessine plus de CHART_WEBGL_THRESHOLD
+    points au total (points par courbe x nombre de courbes), 'svg' sinon. À appeler sur le DataFrame
+    déjà passé par `downsample_frame` : seuls ces points sont envoyés au navigateur.
+    """
+    return "webgl" if int(df.count().sum()) > CHART_WEBGL_THRESHOLD else "svg"
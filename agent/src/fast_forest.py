@@ -0,0 +1,126 @@
+# src/fast_forest.py
+
+import numpy as np
+import pandas as pd
+
+
+class FlatForest:
+    """
+    Moteur d'inférence "à plat" pour un RandomForestClassifier entraîné avec sklearn.
+
+    Tous les arbres sont aplatis dans des tableaux NumPy contigus (feature, seuil, enfants,
+    probabilités des feuilles) puis évalués niveau par niveau, pour toutes les lignes et
+    tous les arbres à la fois. On évite ainsi la validation et la boucle Python de sklearn,
+    qui dominent le coût pour une seule ligne.
+
+    Les calculs reproduisent exactement ceux de sklearn (X converti en float32, probabilités
+    normalisées par arbre, puis sommées dans l'ordre des arbres) : les probabilités obtenues
+    sont identiques au bit près à `model.predict_proba`.
+    """
+
+    def __init__(self, model):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Seuls les modèles à une seule sortie sont supportés.")
+
+        self.n_classes = int(model.n_classes_)
+        self.n_trees = len(trees)
+        self.feature_names = [str(name) for name in getattr(model, "feature_names_in_", [])]
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Une feuille boucle sur elle-même : elle reste en place pendant les niveaux suivants
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+
+            # Même normalisation que DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :self.n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer[:, np.newaxis])
+
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp)
+        self.right = np.ascontiguousarray(np.concatenate(rights), dtype=np.intp)
+        self.value = np.ascontiguousarray(np.concatenate(values))
+        self.roots = np.asarray(roots, dtype=np.intp)
+
+    def _as_array(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame) and self.feature_names:
+            X = X[self.feature_names]
+        # sklearn évalue les arbres sur des float32 : on fait de même pour des décisions identiques
+        return np.asarray(X, dtype=np.float32)
+
+    def apply(self, X) -> np.ndarray:
+        """Renvoie l'indice (global) de la feuille atteinte, de forme (n_arbres, n_lignes)."""
+        X = self._as_array(X)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaf_proba = self.value[self.apply(X)]
+        all_proba = np.zeros((leaf_proba.shape[1], self.n_classes), dtype=np.float64)
+        # Somme arbre par arbre, dans le même ordre que sklearn, pour un résultat identique au bit près
+        for tree_proba in leaf_proba:
+            all_proba += tree_proba
+        all_proba /= self.n_trees
+        return all_proba
+
+    def verify(self, model, X) -> bool:
+        """Vérifie que les probabilités sont identiques au bit près à celles de sklearn."""
+        expected = model.predict_proba(X)
+        return np.array_equal(self.predict_proba(X), expected)
+
+
+def verification_sample(engine: FlatForest, n_rows: int = 256, seed: int = 0) -> pd.DataFrame:
+    """
+    Construit des lignes de test autour des seuils réellement utilisés par la forêt,
+    afin d'exercer les deux branches de la plupart des noeuds.
+    """
+    rng = np.random.default_rng(seed)
+    n_features = len(engine.feature_names) or int(engine.feature.max()) + 1
+    is_split = engine.left != np.arange(len(engine.left))
+    columns = []
+    for feature_index in range(n_features):
+        feature_thresholds = engine.threshold[is_split & (engine.feature == feature_index)]
+        if len(feature_thresholds) == 0:
+            columns.append(rng.normal(size=n_rows))
+            continue
+        picked = rng.choice(feature_thresholds, size=n_rows)
+        columns.append(picked + rng.normal(scale=np.abs(picked) * 1e-3 + 1e-9))
+    return pd.DataFrame(np.column_stack(columns), columns=engine.feature_names or None)
+
+
+if __name__ == '__main__':
+    # Micro-benchmark : sklearn vs moteur à plat, pour des lots de 1, 100 et 10 000 lignes.
+    # Usage (depuis la racine du repo) : python agent/src/fast_forest.py [chemin_du_modele]
+    import sys
+    import timeit
+    import joblib
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'models/rf_fundamental_market_classifier.joblib'
+    model = joblib.load(model_path)
+    engine = FlatForest(model)
+
+    for batch_size in (1, 100, 10_000):
+        X = verification_sample(engine, n_rows=batch_size, seed=batch_size)
+        assert engine.verify(model, X), f"Probabilités différentes pour un lot de {batch_size} lignes"
+        repeat = max(3, 2000 // batch_size)
+        sklearn_time = min(timeit.repeat(lambda: model.predict_proba(X), number=1, repeat=repeat))
+        flat_time = min(timeit.repeat(lambda: engine.predict_proba(X), number=1, repeat=repeat))
+        print(f"lot={batch_size:>6} | sklearn: {sklearn_time * 1e3:8.3f} ms | à plat: {flat_time * 1e3:8.3f} ms | x{sklearn_time / flat_time:.1f}")
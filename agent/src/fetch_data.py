@@ -1,54 +1,77 @@
 # src/fetch_data.py
 
-import requests
 import pandas as pd
 import os
+from .cache import TTLDiskCache
+# L'exception personnalisée est définie avec le client HTTP partagé, on la ré-exporte ici
+# pour que les imports existants (`from src.fetch_data import APILimitError`) restent valides.
+from .http_client import APILimitError, get_json
+from .singleflight import fmp_flight
+from .rate_limit import rate_limiter
+from .resilience import fmp_guard, CircuitOpenError
 
 FMP_API_KEY = os.getenv("FMP_API_KEY")
 
-# --- NOUVEAU : Définition d'une exception personnalisée ---
-class APILimitError(Exception):
-    """Exception levée lorsque la clé API est invalide, expirée ou a atteint sa limite."""
-    pass
+# Cache disque des key-metrics FMP : les métriques annuelles ne changent que quelques fois par an.
+KEY_METRICS_CACHE_TTL = float(os.getenv("FMP_CACHE_TTL_SECONDS", 24 * 3600))
+KEY_METRICS_CACHE_STALE = float(os.getenv("FMP_CACHE_STALE_SECONDS", 7 * 24 * 3600))
+KEY_METRICS_CACHE_MAX_ENTRIES = int(os.getenv("FMP_CACHE_MAX_ENTRIES", 1000))
 
-def fetch_fundamental_data(ticker: str) -> pd.DataFrame:
+key_metrics_cache = TTLDiskCache(
+    "fmp_key_metrics",
+    ttl_seconds=KEY_METRICS_CACHE_TTL,
+    stale_seconds=KEY_METRICS_CACHE_STALE,
+    max_entries=KEY_METRICS_CACHE_MAX_ENTRIES,
+)
+
+def fetch_fundamental_data(ticker: str, period: str = "annual") -> pd.DataFrame:
     """
     Récupère les données fondamentales d'une action.
-    Lève une APILimitError si la clé API a un problème ou si la limite est atteinte.
-    Lève une ValueError pour les autres erreurs d'API.
+    Les réponses de l'API sont mises en cache sur disque par (ticker, période).
+    Lève une APILimitError si la clé API a un problème, si la limite est atteinte ou si la requête
+    est refusée (InvalidRequestError pour un 400/404).
+    Lève une ValueError si la réponse est vide (ticker probablement invalide).
     """
+    cache_key = f"{ticker.upper()}:{period}"
+    # En cas d'absence du cache, les sessions qui demandent la même clé au même moment partagent un seul appel
+    def _fetch():
+        return fmp_flight.do(f"key-metrics:{cache_key}", lambda: fmp_guard.call(lambda: _download_key_metrics(ticker, period)))
+
+    try:
+        data = key_metrics_cache.get_or_fetch(cache_key, _fetch)
+    except CircuitOpenError:
+        # FMP est jugé indisponible : une valeur expirée vaut mieux qu'une erreur
+        data = key_metrics_cache.get(cache_key, allow_expired=True)
+        if data is None:
+            raise
+        print(f"FMP indisponible : key-metrics de '{cache_key}' servies depuis le cache expiré.")
+    return pd.DataFrame(data)
+
+def _download_key_metrics(ticker: str, period: str) -> list:
+    """Appelle l'endpoint key-metrics de FMP et renvoie la liste JSON brute."""
     if not FMP_API_KEY:
         raise ValueError("La clé API FMP_API_KEY n'est pas configurée dans les variables d'environnement.")
 
     BASE_URL = "https://financialmodelingprep.com/api/v3/key-metrics/"
-    url = f"{BASE_URL}{ticker}?period=annual&apikey={FMP_API_KEY}"
-
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        if not data: # Si la réponse est OK mais vide (ex: ticker invalide)
-            raise ValueError(f"Aucune donnée retournée pour le ticker '{ticker}'. Il est peut-être invalide.")
-        return pd.DataFrame(data)
-    else:
-        # --- MODIFICATION CLÉ : Gérer les erreurs spécifiques ---
-        # 401: Unauthorized (clé invalide), 429: Too Many Requests (limite atteinte)
-        if response.status_code in [401, 429]:
-            try:
-                # Essayer de récupérer le message d'erreur de l'API
-                error_message = response.json().get('error', "La limite d'utilisation de la clé API a été atteinte ou la clé est invalide.")
-            except:
-                error_message = "La limite d'utilisation de la clé API a été atteinte ou la clé est invalide."
-            raise APILimitError(error_message)
-        else:
-            # Pour toutes les autres erreurs HTTP
-            raise ValueError(f"Erreur de l'API pour {ticker}: Status {response.status_code}, Réponse: {response.text}")
+    params = {'period': period, 'apikey': FMP_API_KEY}
+
+    # Le client partagé gère les délais, les nouvelles tentatives et convertit
+    # les erreurs 401/429 (clé invalide ou limite atteinte) en APILimitError.
+    data = get_json(f"{BASE_URL}{ticker}", params=params, service="FMP", provider="fmp")
+    if not data: # Si la réponse est OK mais vide (ex: ticker invalide)
+        raise ValueError(f"Aucune donnée retournée pour le ticker '{ticker}'. Il est peut-être invalide.")
+    return data
 
 if __name__ == '__main__':
     # Example usage for testing
     try:
         aapl_data = fetch_fundamental_data("AAPL")
         print("\nAAPL Data Fetched Successfully!")
+        fetch_fundamental_data("AAPL") # Le second appel doit être servi par le cache
+        print(f"Statistiques du cache : {key_metrics_cache.stats()}")
+        print(f"Statistiques du single-flight : {fmp_flight.stats()}")
+        print(f"Budget restant du quota FMP : {rate_limiter.remaining('fmp')}")
+        print(f"Statistiques du fournisseur : {fmp_guard.stats()}")
     except ValueError as e:
         print(f"Error fetching AAPL data: {e}")
 
@@ -1,11 +1,10 @@
 # src/fetch_news.py
 
-import requests
 import os
 import json
 from datetime import datetime, timedelta
-# On peut garder notre exception personnalisée pour la cohérence
-from .fetch_data import APILimitError 
+# Le client partagé convertit les erreurs réseau et de quota en APILimitError
+from .http_client import get_json
 
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 
@@ -35,31 +34,21 @@ def fetch_recent_news(ticker: str, company_name: str, limit: int = 3) -> str:
         'pageSize': limit           # Le nombre d'articles à retourner
     }
 
-    try:
-        response = requests.get(BASE_URL, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        articles = data.get("articles", [])
-
-        if not articles:
-            return json.dumps([]) # Retourne une liste vide si rien n'est trouvé
-
-        # --- On adapte le formatage à la structure de NewsAPI ---
-        articles_to_return = []
-        for article in articles:
-            articles_to_return.append({
-                "title": article.get('title'),
-                "site": article.get('source', {}).get('name'), # La source est dans un sous-dictionnaire
-                "url": article.get('url'),
-                "image": article.get('urlToImage') # Le champ s'appelle urlToImage
-            })
-        
-        return json.dumps(articles_to_return)
-
-    except requests.exceptions.HTTPError as http_err:
-        # NewsAPI renvoie des messages d'erreur clairs en cas de problème
-        error_details = http_err.response.json()
-        raise APILimitError(f"Erreur de l'API d'actualités : {error_details.get('message')}")
-    except requests.exceptions.RequestException as req_err:
-        raise APILimitError(f"Impossible de contacter le service d'actualités. Erreur: {req_err}")
\ No newline at end of file
+    # NewsAPI renvoie des messages d'erreur clairs, repris tels quels dans l'APILimitError
+    data = get_json(BASE_URL, params=params, service="l'API d'actualités", provider="newsapi")
+    articles = data.get("articles", [])
+
+    if not articles:
+        return json.dumps([]) # Retourne une liste vide si rien n'est trouvé
+
+    # --- On adapte le formatage à la structure de NewsAPI ---
+    articles_to_return = []
+    for article in articles:
+        articles_to_return.append({
+            "title": article.get('title'),
+            "site": article.get('source', {}).get('name'), # La source est dans un sous-dictionnaire
+            "url": article.get('url'),
+            "image": article.get('urlToImage') # Le champ s'appelle urlToImage
+        })
+    
+    return json.dumps(articles_to_return)
\ No newline at end of file
@@ -1,13 +1,107 @@
 # agent/src/fetch_price.py
 
-import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
+from .price_store import price_store
+from .singleflight import yfinance_flight
+from .resilience import yfinance_guard
+from .http_client import APILimitError
+
+# Erreurs yfinance (`repr` de l'exception) qui signalent un fournisseur injoignable, pas un ticker inconnu.
+# "Failed to perform" préfixe toutes les erreurs de transport de curl_cffi (DNS, connexion, TLS...).
+YFINANCE_TRANSIENT_ERRORS = ("Failed to perform", "ConnectionError", "Timeout", "RateLimit", "Too Many Requests", "SSLError", "ProxyError")
+
+def _download_or_raise(yf, symbols: list[str], start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """
+    yf.download ne lève jamais : les erreurs de chaque ticker sont rangées dans `yf.shared._ERRORS`
+    et un DataFrame vide est renvoyé. Si tous les tickers ont échoué sur une erreur réseau, un délai
+    ou une limite de débit, on lève une APILimitError pour que le disjoncteur compte l'échec.
+    Un ticker réellement inconnu donne toujours un résultat vide.
+    """
+    price_df = yf.download(
+        symbols, start=start_date, end=end_date, progress=False, auto_adjust=True,
+        threads=True, group_by='column'
+    )
+    # À lire tout de suite : l'état est global au module et remis à zéro au prochain téléchargement
+    errors = dict(getattr(yf.shared, "_ERRORS", {}) or {})
+    failed = {symbol: errors.get(symbol, "") for symbol in symbols}
+    if all(any(marker in error for marker in YFINANCE_TRANSIENT_ERRORS) for error in failed.values()):
+        raise APILimitError(f"Yahoo Finance injoignable pour {symbols} : {next(iter(failed.values()))}")
+    return price_df
+
+def _download_closes(tickers: list[str], start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """
+    Télécharge en un seul appel yfinance (multi-threadé) les prix de clôture de plusieurs tickers.
+
+    Returns:
+        pd.DataFrame: Une matrice large alignée sur les dates, une colonne par ticker (en majuscules).
+                      Les tickers sans aucune donnée sont absents du résultat.
+    """
+    import yfinance as yf # Import à la première utilisation : yfinance est lent à charger
+    symbols = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    # Les sessions qui demandent la même plage pour les mêmes tickers au même moment partagent un seul téléchargement
+    flight_key = f"download:{','.join(sorted(symbols))}:{start_date:%Y-%m-%d}:{end_date:%Y-%m-%d}"
+    # Le disjoncteur coupe les appels quand Yahoo ne répond plus (erreurs réseau relevées par _download_or_raise)
+    price_df = yfinance_flight.do(flight_key, lambda: yfinance_guard.call(
+        lambda: _download_or_raise(yf, symbols, start_date, end_date)
+    ))
+
+    if price_df.empty:
+        return pd.DataFrame(columns=symbols)
+
+    closes = price_df['Close']
+    # Selon la version de yfinance, un ticker seul peut revenir sous forme de Series
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(name=symbols[0])
+
+    closes.columns = [str(col).upper() for col in closes.columns]
+    return closes.reindex(columns=symbols).dropna(axis=1, how='all')
+
+def _get_closes(tickers: list[str], start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """Clôtures depuis le stockage local ; si Yahoo est indisponible, on sert ce qui est déjà stocké."""
+    try:
+        return price_store.get_closes(tickers, start_date, end_date, _download_closes)
+    except APILimitError: # Yahoo injoignable ou disjoncteur ouvert (CircuitOpenError)
+        closes = price_store.get_closes(tickers, start_date, end_date, None)
+        if closes.empty or closes.shape[1] == 0:
+            raise
+        print(f"yfinance indisponible : prix de {list(closes.columns)} servis depuis le stockage local (peut-être incomplets).")
+        return closes
+
+def fetch_price_histories(tickers: list[str], period_days: int = 252) -> pd.DataFrame:
+    """
+    Récupère en un seul téléchargement l'historique des prix de clôture de plusieurs tickers.
+
+    Args:
+        tickers (list[str]): Les tickers à récupérer (ex: ['AAPL', 'AIR.PA', 'QQQ']).
+        period_days (int): Le nombre de jours dans le passé à récupérer.
+
+    Returns:
+        pd.DataFrame: Un DataFrame avec 'date' en index et une colonne de clôture par ticker.
+                      Les tickers introuvables sont absents des colonnes.
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=period_days)
+
+    try:
+        # Le stockage local ne télécharge que les plages qu'il ne possède pas encore
+        closes = _get_closes(tickers, start_date, end_date)
+    except APILimitError:
+        raise # Erreur du fournisseur (quota, réseau, disjoncteur ouvert) : on la laisse remonter telle quelle
+    except Exception as e:
+        raise ValueError(f"Impossible de traiter les données de prix de yfinance pour {tickers}: {e}")
+
+    missing = [ticker.upper() for ticker in tickers if ticker.upper() not in closes.columns]
+    if missing:
+        print(f"yfinance: Aucun historique de prix trouvé pour {missing}.")
+    print(f"yfinance: Historique de prix récupéré avec succès pour {list(closes.columns)}.")
+    return closes
 
 def fetch_price_history(ticker: str, period_days: int = 252) -> pd.DataFrame:
     """
     Récupère l'historique des prix de clôture pour un ticker sur une période donnée
     en utilisant la librairie yfinance pour une couverture internationale.
+    Les prix déjà téléchargés sont servis depuis le stockage local (src/price_store.py).
     
     Args:
         ticker (str): Le ticker de l'action (ex: 'AAPL', '005930.KS', 'AIR.PA').
@@ -20,23 +114,20 @@ def fetch_price_history(ticker: str, period_days: int = 252) -> pd.DataFrame:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=period_days)
         
-        price_df = yf.download(ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
+        closes = _get_closes([ticker], start_date, end_date)
         
-        if price_df.empty:
+        if closes.empty or closes.shape[1] == 0:
             raise ValueError(f"Aucun historique de prix trouvé pour le ticker '{ticker}'. Il est peut-être invalide ou non listé sur Yahoo Finance.")
             
-        df_close = price_df[['Close']].copy()
-        
-        # Si les colonnes sont un MultiIndex (ex: [('Close', 'TICKER')]), on l'aplatit.
-        if isinstance(df_close.columns, pd.MultiIndex):
-            df_close.columns = df_close.columns.droplevel(1)
-
         # Rename the column to 'close' to match the rest of the agent's expectations
-        df_close.rename(columns={'Close': 'close'}, inplace=True)
+        df_close = closes.iloc[:, [0]].dropna().copy()
+        df_close.columns = ['close']
         
         print(f"yfinance: Historique de prix récupéré avec succès pour {ticker}.")
         return df_close
 
+    except APILimitError:
+        raise # Erreur du fournisseur (quota, réseau, disjoncteur ouvert) : on la laisse remonter telle quelle
     except Exception as e:
         raise ValueError(f"Impossible de traiter les données de prix de yfinance pour {ticker}: {e}")
 
@@ -52,6 +143,11 @@ if __name__ == '__main__':
         print("\nHistorique des prix pour Airbus (AIR.PA):")
         print(airbus_prices.head())
         print(f"Column name for Airbus: {airbus_prices.columns[0]}")
+
+        # Un seul téléchargement pour plusieurs tickers
+        multi_prices = fetch_price_histories(["AAPL", "MSFT", "QQQ"], period_days=90)
+        print(multi_prices.tail())
+        print(f"Statistiques du single-flight : {yfinance_flight.stats()}")
         
     except Exception as e:
         print(f"Erreur: {e}")
\ No newline at end of file
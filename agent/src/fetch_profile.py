@@ -1,9 +1,10 @@
 # Fichier: src/fetch_profile.py
 
-import requests
 import os
 import json
-from .fetch_data import APILimitError # On réutilise notre exception personnalisée
+from .http_client import get_json
+from .singleflight import fmp_flight
+from .resilience import fmp_guard
 
 FMP_API_KEY = os.getenv("FMP_API_KEY")
 
@@ -15,14 +16,15 @@ def fetch_company_profile(ticker: str) -> str:
     if not FMP_API_KEY:
         raise ValueError("La clé API FMP_API_KEY n'est pas configurée.")
 
-    BASE_URL = "https://financialmodelingprep.com/stable/profile/?symbol="
-    url = f"{BASE_URL}{ticker}&apikey={FMP_API_KEY}"
+    BASE_URL = "https://financialmodelingprep.com/stable/profile/"
+    params = {'symbol': ticker, 'apikey': FMP_API_KEY}
 
     try:
-        response = requests.get(url)
-        response.raise_for_status() # Lève une exception pour les erreurs HTTP
-
-        data = response.json()
+        # Les erreurs réseau et de quota sont converties en APILimitError par le client partagé.
+        # Les demandes simultanées du même profil partagent un seul appel, protégé par le disjoncteur FMP.
+        data = fmp_flight.do(f"profile:{ticker.upper()}", lambda: fmp_guard.call(
+            lambda: get_json(BASE_URL, params=params, service="FMP (profil)", provider="fmp")
+        ))
         if not data:
             raise ValueError(f"Aucun profil trouvé pour le ticker '{ticker}'.")
 
@@ -45,8 +47,6 @@ def fetch_company_profile(ticker: str) -> str:
         
         return json.dumps(key_info)
 
-    except requests.exceptions.RequestException as e:
-        raise APILimitError(f"Erreur de réseau en contactant FMP pour le profil de {ticker}: {e}")
     except (ValueError, IndexError) as e:
         # Gère le cas où le ticker est invalide ou la réponse est vide
         raise ValueError(f"Impossible de traiter la réponse du profil pour {ticker}: {e}")
\ No newline at end of file
@@ -0,0 +1,68 @@
+# src/figure_codec.py
+
+import os
+import json
+import zlib
+import base64
+import numpy as np
+
+# Compression zlib des figures encodées (au-delà d'une taille minimale)
+FIGURE_COMPRESSION = os.getenv("STELLA_FIGURE_COMPRESSION", "1") == "1"
+FIGURE_COMPRESSION_MIN_BYTES = int(os.getenv("STELLA_FIGURE_COMPRESSION_MIN_BYTES", 2048))
+
+# Préfixes qui identifient le format ; sans préfixe, la chaîne est un ancien JSON plotly
+ENCODED_PREFIX = "stella-fig1:"
+COMPRESSED_PREFIX = "stella-fig1z:"
+
+
+def _encode_value(value):
+    """Remplace récursivement les tableaux numpy par des buffers binaires typés en base64."""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "fiubM":
+            array = np.ascontiguousarray(value)
+            if array.dtype.kind == "M":
+                array = array.astype("datetime64[ns]")
+            array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+            return {"dtype": array.dtype.str, "bdata": base64.b64encode(array.tobytes()).decode("ascii"), "shape": list(array.shape)}
+        return [_encode_value(item) for item in value.tolist()]
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _decode_array(obj: dict):
+    """object_hook JSON : reconstruit un tableau numpy (y compris les buffers typés natifs de plotly)."""
+    if "bdata" not in obj or "dtype" not in obj:
+        return obj
+    array = np.frombuffer(base64.b64decode(obj["bdata"]), dtype=np.dtype(obj["dtype"]))
+    shape = obj.get("shape")
+    if isinstance(shape, str): # Format plotly : "3, 3"
+        shape = [int(dim) for dim in shape.split(",")]
+    return array.reshape(shape) if shape else array
+
+
+def encode_figure(fig) -> str:
+    """
+    Sérialise une figure plotly de façon compacte : les séries (y compris les dates) sont stockées
+    en buffers binaires typés, et le tout est compressé au-delà de FIGURE_COMPRESSION_MIN_BYTES.
+    """
+    from plotly.utils import PlotlyJSONEncoder
+    payload = json.dumps(_encode_value(fig.to_plotly_json()), cls=PlotlyJSONEncoder, separators=(",", ":"))
+    if FIGURE_COMPRESSION and len(payload) >= FIGURE_COMPRESSION_MIN_BYTES:
+        return COMPRESSED_PREFIX + base64.b64encode(zlib.compress(payload.encode("utf-8"), 6)).decode("ascii")
+    return ENCODED_PREFIX + payload
+
+
+def decode_figure(raw: str):
+    """Reconstruit la figure plotly encodée par `encode_figure` (ou un ancien JSON `pio.to_json`)."""
+    import plotly.graph_objects as go
+    if raw.startswith(COMPRESSED_PREFIX):
+        payload = zlib.decompress(base64.b64decode(raw[len(COMPRESSED_PREFIX):])).decode("utf-8")
+    elif raw.startswith(ENCODED_PREFIX):
+        payload = raw[len(ENCODED_PREFIX):]
+    else:
+        import plotly.io as pio
+        return go.Figure(pio.from_json(raw))
+    return go.Figure(json.loads(payload, object_hook=_decode_array))
@@ -0,0 +1,134 @@
+# src/http_client.py
+
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .rate_limit import rate_limiter, current_lane, RATE_LIMIT_DEADLINES
+
+# Délais par défaut (secondes) : connexion puis lecture. Aucun appel ne doit pouvoir bloquer indéfiniment.
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15))
+# Nombre de nouvelles tentatives après le premier essai, et base du backoff exponentiel
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.3))
+# Taille des pools keep-alive (nombre d'hôtes gardés, connexions par hôte)
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", 8))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+LIMIT_STATUS_CODES = {401, 403, 429}
+INVALID_REQUEST_STATUS_CODES = {400, 404}
+
+
+class APILimitError(Exception):
+    """Exception levée lorsque la clé API est invalide, expirée ou a atteint sa limite."""
+    pass
+
+
+class InvalidRequestError(APILimitError):
+    """Requête refusée par le fournisseur (400/404 : paramètre ou ticker invalide)."""
+    pass
+
+
+class QuotaExhaustedError(APILimitError):
+    """Quota local (src/rate_limit.py) épuisé : la requête n'a pas été envoyée au fournisseur."""
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Renvoie la session HTTP partagée par tous les fetchers de src.
+    urllib3 garde un pool de connexions keep-alive par hôte, ce qui évite de refaire
+    la poignée de main TCP+TLS à chaque appel.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff exponentiel avec "full jitter" pour ne pas synchroniser les nouvelles tentatives."""
+    return random.uniform(0, HTTP_BACKOFF_BASE * (2 ** attempt))
+
+def _error_message(response: requests.Response) -> str:
+    """Extrait le message d'erreur renvoyé par l'API (FMP et NewsAPI n'utilisent pas la même clé)."""
+    try:
+        payload = response.json()
+    except ValueError:
+        return response.text[:200]
+    if isinstance(payload, dict):
+        for key in ("Error Message", "message", "error"):
+            if payload.get(key):
+                return str(payload[key])
+    return response.text[:200]
+
+def http_get(url: str, params: dict = None, service: str = "l'API", timeout=None, provider: str = None) -> requests.Response:
+    """
+    Effectue un GET via la session partagée, avec délais par défaut et nouvelles tentatives
+    (avec jitter) sur les erreurs 5xx et les erreurs de connexion.
+
+    Avec `provider` (ex : "fmp"), chaque tentative consomme un jeton du quota partagé du fournisseur
+    (src/rate_limit.py) : près de la limite, la requête attend son tour au lieu d'échouer, et
+    une réponse 429 vide le seau puis est retentée une fois le quota rechargé.
+
+    Correspondance des erreurs :
+        - 401/403/429, erreur réseau persistante ou 5xx persistante -> APILimitError
+        - attente de quota local trop longue -> QuotaExhaustedError (sous-classe d'APILimitError)
+        - 400/404 (requête ou ticker invalide) -> InvalidRequestError (sous-classe d'APILimitError),
+          avec le message du fournisseur
+    """
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    session = get_session()
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        is_last_attempt = attempt == HTTP_MAX_RETRIES
+        if provider and not rate_limiter.acquire(provider):
+            raise QuotaExhaustedError(
+                f"Quota de requêtes de {service} atteint : aucune requête n'a pu partir en "
+                f"{RATE_LIMIT_DEADLINES[current_lane()]:.0f}s. Réessayez dans un instant."
+            )
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if is_last_attempt:
+                raise APILimitError(f"Impossible de contacter {service}. Erreur: {e}")
+            time.sleep(_backoff_delay(attempt))
+            continue
+        except requests.exceptions.RequestException as e:
+            raise APILimitError(f"Erreur lors de l'appel à {service}. Erreur: {e}")
+
+        if response.status_code in RETRY_STATUS_CODES and not is_last_attempt:
+            time.sleep(_backoff_delay(attempt))
+            continue
+        if response.status_code == 429 and provider and not is_last_attempt:
+            print(f"{service} : quota dépassé (429), nouvelle tentative après recharge du quota.")
+            rate_limiter.drain(provider)
+            continue
+
+        if response.ok:
+            return response
+        if response.status_code in LIMIT_STATUS_CODES:
+            raise APILimitError(f"Erreur de {service} (Status {response.status_code}) : {_error_message(response)}")
+        if response.status_code in INVALID_REQUEST_STATUS_CODES:
+            raise InvalidRequestError(f"Requête refusée par {service} (Status {response.status_code}) : {_error_message(response)}")
+        raise APILimitError(f"Erreur de {service} : Status {response.status_code}, Réponse: {_error_message(response)}")
+
+def get_json(url: str, params: dict = None, service: str = "l'API", timeout=None, provider: str = None):
+    """Comme http_get, mais renvoie directement le corps JSON décodé."""
+    response = http_get(url, params=params, service=service, timeout=timeout, provider=provider)
+    try:
+        return response.json()
+    except ValueError as e:
+        raise APILimitError(f"Réponse invalide reçue de {service}. Erreur: {e}")
@@ -0,0 +1,49 @@
+# src/metrics.py
+
+import os
+import threading
+
+# Période du journal des métriques (secondes) ; 0 désactive le journal périodique
+METRICS_LOG_SECONDS = float(os.getenv("STELLA_METRICS_LOG_SECONDS", 300))
+
+_logger_started = False
+_logger_lock = threading.Lock()
+
+
+def report(source: str, values: dict) -> None:
+    """Écrit une ligne de métriques au format `Métriques <source> : clé=valeur, ...` dans les logs."""
+    print(f"Métriques {source} : " + ", ".join(f"{key}={value}" for key, value in values.items()))
+
+def collect() -> dict:
+    """Rassemble les compteurs des couches d'accès aux fournisseurs, par source."""
+    # Imports locaux : ces modules rapportent eux-mêmes leurs événements via `report`
+    from .rate_limit import rate_limiter
+    from .fetch_data import key_metrics_cache
+    from .singleflight import fmp_flight, yfinance_flight
+    sources = {f"quota {provider}": stats for provider, stats in rate_limiter.stats().items()}
+    sources["cache fmp_key_metrics"] = key_metrics_cache.stats()
+    for flight in (fmp_flight, yfinance_flight):
+        sources[f"single-flight {flight.name}"] = flight.stats()
+    return sources
+
+def log_metrics() -> None:
+    for source, values in collect().items():
+        report(source, values)
+
+def start_metrics_logger(interval: float = METRICS_LOG_SECONDS) -> None:
+    """Démarre (une seule fois par processus) le thread qui journalise les métriques périodiquement."""
+    global _logger_started
+    with _logger_lock:
+        if _logger_started or interval <= 0:
+            return
+        _logger_started = True
+
+    def _loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            try:
+                log_metrics()
+            except Exception as e:
+                print(f"Métriques : échec de la collecte : {e}")
+
+    threading.Thread(target=_loop, name="metrics-logger", daemon=True).start()
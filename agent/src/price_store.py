@@ -0,0 +1,230 @@
+# src/price_store.py
+
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from .cache import CACHE_DIR
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(CACHE_DIR, "prices"))
+# Nombre maximal de tickers conservés (éviction LRU au-delà)
+PRICE_STORE_MAX_TICKERS = int(os.getenv("PRICE_STORE_MAX_TICKERS", 500))
+# Profondeur d'historique conservée : les lignes plus anciennes sont supprimées à la compaction
+PRICE_STORE_RETENTION_DAYS = int(os.getenv("PRICE_STORE_RETENTION_DAYS", 10 * 365))
+# Durée pendant laquelle la dernière séance stockée est considérée à jour (cours intrajournalier)
+PRICE_STORE_REFRESH_SECONDS = float(os.getenv("PRICE_STORE_REFRESH_SECONDS", 15 * 60))
+
+# Une ligne par séance : la date (au jour près) et le prix de clôture ajusté
+RECORD_DTYPE = np.dtype([('date', 'datetime64[D]'), ('close', 'f8')])
+
+
+def _covered_until(last_session: date, seg_end: date) -> date:
+    """
+    Fin de plage réellement couverte par un téléchargement : `seg_end` si seul un week-end sépare
+    la dernière séance connue de `seg_end` (la séance du jour `seg_end` peut ne pas avoir encore eu lieu),
+    sinon la dernière séance connue. Un jour férié fait simplement retélécharger la plage.
+    """
+    if seg_end <= last_session:
+        return seg_end
+    return seg_end if np.busday_count(last_session + timedelta(days=1), seg_end) == 0 else last_session
+
+
+class PriceStore:
+    """
+    Stockage local et colonnaire des prix de clôture, un fichier NumPy (.npy) par ticker,
+    lu en mémoire mappée.
+
+    Un index JSON mémorise pour chaque ticker la plage de dates couverte : seules les
+    portions manquantes (début ou fin de fenêtre) sont téléchargées, puis toute fenêtre
+    `period_days` est servie par simple découpage du fichier.
+    """
+
+    def __init__(self, directory: str = PRICE_STORE_DIR, max_tickers: int = PRICE_STORE_MAX_TICKERS,
+                 retention_days: int = PRICE_STORE_RETENTION_DAYS, refresh_seconds: float = PRICE_STORE_REFRESH_SECONDS):
+        self.directory = directory
+        self.max_tickers = max_tickers
+        self.retention_days = retention_days
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._index = None
+
+    # --- Index des plages couvertes ---
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    # --- Fichiers de données ---
+    def _data_path(self, ticker: str) -> str:
+        safe_name = "".join(c if c.isalnum() or c in ".-_" else "_" for c in ticker)
+        return os.path.join(self.directory, f"{safe_name}.npy")
+
+    def _load_records(self, ticker: str, mmap: bool = True) -> np.ndarray:
+        try:
+            return np.load(self._data_path(ticker), mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+    def _write_records(self, ticker: str, records: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._data_path(ticker)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+
+    # --- Planification des téléchargements ---
+    def _missing_segments(self, ticker: str, start: date, end: date) -> list:
+        """Renvoie les plages [début, fin] (inclusives) à télécharger pour couvrir [start, end]."""
+        meta = self._load_index().get(ticker)
+        if not meta:
+            return [(start, end)]
+
+        stored_start = date.fromisoformat(meta["start"])
+        stored_end = date.fromisoformat(meta["end"])
+        segments = []
+        if start < stored_start:
+            segments.append((start, stored_start - timedelta(days=1)))
+        # La dernière séance stockée est re-téléchargée : elle a pu être enregistrée en cours de journée.
+        tail_is_stale = stored_end >= date.today() and time.time() - meta.get("fetched_at", 0) > self.refresh_seconds
+        if end > stored_end or (end == stored_end and tail_is_stale):
+            segments.append((stored_end, end))
+        return segments
+
+    def _merge(self, ticker: str, closes: pd.Series, seg_start: date, seg_end: date) -> None:
+        """Fusionne une plage téléchargée dans le fichier du ticker (les nouvelles valeurs l'emportent)."""
+        closes = closes.dropna()
+        new_records = np.empty(len(closes), dtype=RECORD_DTYPE)
+        new_records['date'] = closes.index.values.astype('datetime64[D]')
+        new_records['close'] = closes.values
+
+        index = self._load_index()
+        meta = index.get(ticker)
+        if meta is None and len(new_records) == 0:
+            return # Ticker inconnu de Yahoo : on ne mémorise rien pour pouvoir réessayer plus tard
+
+        # La plage n'est couverte que jusqu'aux dates réellement reçues : yf.download renvoie un cadre
+        # vide (ou tronqué) sur un échec passager, qui ne doit pas marquer la plage comme téléchargée
+        last_session = new_records['date'].max().astype(object) if len(new_records) else date.fromisoformat(meta["end"])
+        seg_end = min(seg_end, date.today())
+        covered_end = _covered_until(last_session, seg_end)
+        if len(new_records) == 0 and covered_end <= last_session:
+            return # Aucune séance reçue sur des jours ouvrés : l'index reste inchangé, la plage sera redemandée
+
+        existing = self._load_records(ticker, mmap=False)
+        keep = ~np.isin(existing['date'], new_records['date'])
+        records = np.concatenate([existing[keep], new_records])
+        records.sort(order='date')
+
+        start, end = seg_start, covered_end
+        if meta:
+            start = min(start, date.fromisoformat(meta["start"]))
+            end = max(end, date.fromisoformat(meta["end"]))
+
+        # Compaction : on ne garde pas plus que la profondeur d'historique configurée
+        cutoff = date.today() - timedelta(days=self.retention_days)
+        if start < cutoff:
+            records = records[records['date'] >= np.datetime64(cutoff, 'D')]
+            start = cutoff
+
+        self._write_records(ticker, records)
+        fetched_at = time.time() if covered_end >= end else (meta or {}).get("fetched_at", time.time())
+        index[ticker] = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "fetched_at": fetched_at,
+            "last_access": time.time(),
+        }
+
+    def _evict(self) -> bool:
+        """Supprime les tickers les moins récemment consultés au-delà de `max_tickers`."""
+        index = self._load_index()
+        overflow = len(index) - self.max_tickers
+        if overflow <= 0:
+            return False
+        for ticker in sorted(index, key=lambda t: index[t].get("last_access", 0))[:overflow]:
+            index.pop(ticker, None)
+            try:
+                os.remove(self._data_path(ticker))
+            except OSError:
+                pass
+        return True
+
+    # --- API publique ---
+    def get_closes(self, tickers: list[str], start_date: datetime, end_date: datetime, downloader) -> pd.DataFrame:
+        """
+        Renvoie une matrice large des clôtures sur [start_date, end_date], une colonne par ticker.
+
+        `downloader(tickers, start, end)` n'est appelé que pour les plages manquantes ; les tickers
+        qui partagent la même plage manquante sont téléchargés ensemble en un seul appel.
+        Avec `downloader=None`, seul ce qui est déjà stocké est renvoyé (fournisseur indisponible).
+        """
+        symbols = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        start, end = start_date.date(), end_date.date()
+
+        with self._lock:
+            # 1. On regroupe les tickers par plage manquante identique
+            plan = {}
+            for ticker in symbols if downloader is not None else []:
+                for segment in self._missing_segments(ticker, start, end):
+                    plan.setdefault(segment, []).append(ticker)
+
+        # 2. Un téléchargement par plage (la fin est exclusive pour yfinance).
+        # Le verrou est relâché pendant le réseau pour ne pas bloquer les autres sessions.
+        for (seg_start, seg_end), group in plan.items():
+            print(f"PriceStore: Téléchargement de {group} du {seg_start} au {seg_end}.")
+            downloaded = downloader(
+                group,
+                datetime.combine(seg_start, datetime.min.time()),
+                datetime.combine(seg_end + timedelta(days=1), datetime.min.time()),
+            )
+            with self._lock:
+                for ticker in group:
+                    closes = downloaded[ticker] if ticker in downloaded.columns else pd.Series(dtype=float)
+                    self._merge(ticker, closes, seg_start, seg_end)
+
+        with self._lock:
+            # 3. Lecture des fenêtres demandées par découpage des fichiers mappés en mémoire
+            index = self._load_index()
+            series = []
+            for ticker in symbols:
+                if ticker not in index:
+                    continue
+                index[ticker]["last_access"] = time.time()
+                records = self._load_records(ticker)
+                lo = np.searchsorted(records['date'], np.datetime64(start, 'D'), side='left')
+                hi = np.searchsorted(records['date'], np.datetime64(end, 'D'), side='right')
+                window = np.array(records[lo:hi])
+                if len(window) == 0:
+                    continue
+                series.append(pd.Series(window['close'], index=pd.DatetimeIndex(window['date'].astype('datetime64[ns]'), name='Date'), name=ticker))
+
+            # L'index n'est réécrit que s'il a changé : une lecture pure ne coûte qu'une lecture disque
+            evicted = self._evict()
+            if plan or evicted:
+                self._save_index()
+
+        if not series:
+            return pd.DataFrame(columns=symbols)
+        return pd.concat(series, axis=1)
+
+
+price_store = PriceStore()
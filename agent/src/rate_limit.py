@@ -0,0 +1,167 @@
+# src/rate_limit.py
+
+import os
+import re
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .metrics import report
+
+# Voies de priorité : les requêtes interactives (tour de conversation) passent avant les
+# rafraîchissements en tâche de fond
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Quotas par fournisseur, au format "N/unité" (s, min, h, day) : à aligner sur le plan de la clé API.
+# Une valeur vide désactive la limitation pour ce fournisseur.
+DEFAULT_RATE_LIMITS = {"fmp": "300/min", "newsapi": "100/day"}
+# Temps d'attente maximal d'un jeton avant d'abandonner, par voie
+RATE_LIMIT_DEADLINES = {
+    INTERACTIVE: float(os.getenv("STELLA_RATE_LIMIT_DEADLINE_SECONDS", 10)),
+    BACKGROUND: float(os.getenv("STELLA_RATE_LIMIT_BACKGROUND_DEADLINE_SECONDS", 120)),
+}
+# Part du seau que la voie de fond ne peut pas consommer : elle reste disponible pour les sessions
+RATE_LIMIT_INTERACTIVE_RESERVE = float(os.getenv("STELLA_RATE_LIMIT_INTERACTIVE_RESERVE", 0.2))
+
+_UNIT_SECONDS = {"s": 1, "sec": 1, "second": 1, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+_current_lane = ContextVar("stella_rate_limit_lane", default=INTERACTIVE)
+
+
+def parse_rate(spec: str) -> tuple:
+    """'300/min' -> (300.0, 5.0) : capacité du seau et jetons ajoutés par seconde."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*/\s*([a-z]+?)s?\s*", spec.lower())
+    if not match or match.group(2) not in _UNIT_SECONDS:
+        raise ValueError(f"Quota invalide '{spec}' (format attendu : 'N/s', 'N/min', 'N/h' ou 'N/day').")
+    amount = float(match.group(1))
+    return amount, amount / _UNIT_SECONDS[match.group(2)]
+
+@contextmanager
+def request_lane(lane: str):
+    """Exécute le bloc dans une voie de priorité (les threads démarrés ensuite repartent en INTERACTIVE)."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+class TokenBucket:
+    """
+    Seau à jetons partagé par toutes les sessions du processus, pour un fournisseur.
+    Un appelant sans jeton disponible attend (jusqu'à son échéance) au lieu d'échouer ;
+    la voie de fond cède la place dès qu'une requête interactive attend.
+    """
+
+    def __init__(self, provider: str, capacity: float, refill_per_second: float):
+        self.provider = provider
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._stats = {"granted": 0, "delayed": 0, "rejected": 0, "drains": 0, "waited_seconds": 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def _can_take(self, lane: str) -> bool:
+        if lane == INTERACTIVE:
+            return self._tokens >= 1
+        reserve = self.capacity * RATE_LIMIT_INTERACTIVE_RESERVE
+        return self._waiting[INTERACTIVE] == 0 and self._tokens - 1 >= min(reserve, self.capacity - 1)
+
+    def acquire(self, lane: str = INTERACTIVE, deadline: float = None) -> bool:
+        """Prend un jeton en attendant au plus `deadline` secondes ; renvoie False si l'échéance est dépassée."""
+        deadline = RATE_LIMIT_DEADLINES[lane] if deadline is None else deadline
+        start = time.monotonic()
+        with self._condition:
+            self._waiting[lane] += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._can_take(lane):
+                        self._tokens -= 1
+                        waited = time.monotonic() - start
+                        self._stats["granted"] += 1
+                        if waited > 0.001:
+                            self._stats["delayed"] += 1
+                            self._stats["waited_seconds"] += waited
+                        return True
+                    remaining = deadline - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats["rejected"] += 1
+                        return False
+                    next_token = max(1 - self._tokens, 0) / self.refill_per_second if self.refill_per_second else remaining
+                    self._condition.wait(min(remaining, max(next_token, 0.01)))
+            finally:
+                self._waiting[lane] -= 1
+                self._condition.notify_all()
+
+    def drain(self) -> None:
+        """Vide le seau (le fournisseur a répondu 429) : les appelants suivants attendent la recharge."""
+        with self._condition:
+            self._refill()
+            self._tokens = min(self._tokens, 0)
+            self._stats["drains"] += 1
+        report(f"quota {self.provider}", {"event": "429_drain", **self.stats()})
+
+    def remaining(self) -> float:
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def stats(self) -> dict:
+        with self._condition:
+            self._refill()
+            return {**self._stats, "remaining": round(self._tokens, 2), "capacity": self.capacity,
+                    "refill_per_second": self.refill_per_second, "waiting": dict(self._waiting)}
+
+
+class RateLimiter:
+    """Registre des seaux par fournisseur, configurés par STELLA_RATE_LIMIT_<FOURNISSEUR> (ex : "250/day")."""
+
+    def __init__(self, limits: dict = None):
+        self._limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, provider: str):
+        """Renvoie le seau du fournisseur, ou None si aucun quota n'est configuré."""
+        with self._lock:
+            if provider not in self._buckets:
+                if self._limits is not None:
+                    spec = self._limits.get(provider, "")
+                else:
+                    spec = os.getenv(f"STELLA_RATE_LIMIT_{provider.upper()}", DEFAULT_RATE_LIMITS.get(provider, ""))
+                self._buckets[provider] = TokenBucket(provider, *parse_rate(spec)) if spec else None
+            return self._buckets[provider]
+
+    def acquire(self, provider: str, deadline: float = None) -> bool:
+        bucket = self.bucket(provider)
+        return bucket.acquire(current_lane(), deadline) if bucket else True
+
+    def drain(self, provider: str) -> None:
+        bucket = self.bucket(provider)
+        if bucket:
+            bucket.drain()
+
+    def remaining(self, provider: str):
+        """Budget restant (jetons disponibles) pour le fournisseur, None s'il n'est pas limité."""
+        bucket = self.bucket(provider)
+        return bucket.remaining() if bucket else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = {provider: bucket for provider, bucket in self._buckets.items() if bucket}
+        return {provider: bucket.stats() for provider, bucket in buckets.items()}
+
+
+rate_limiter = RateLimiter()
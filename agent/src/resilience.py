@@ -0,0 +1,178 @@
+# src/resilience.py
+
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from .http_client import APILimitError, InvalidRequestError, QuotaExhaustedError
+
+# Disjoncteur : nombre d'échecs consécutifs avant ouverture, et durée d'ouverture avant un appel d'essai
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("STELLA_CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("STELLA_CIRCUIT_OPEN_SECONDS", 30))
+# Un appel réussi mais plus lent que ce seuil compte comme un échec (délai dépassé)
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("STELLA_CIRCUIT_SLOW_CALL_SECONDS", 10))
+# Seuil propre à Yahoo : le premier remplissage du PriceStore télécharge des années de prix pour plusieurs tickers
+YFINANCE_SLOW_CALL_SECONDS = float(os.getenv("STELLA_YFINANCE_SLOW_CALL_SECONDS", 60))
+# Requêtes de secours ("hedging") : une seconde requête part quand la première dépasse le p95
+HEDGE_REQUESTS = os.getenv("STELLA_HEDGE_REQUESTS", "1") == "1"
+HEDGE_MIN_SAMPLES = int(os.getenv("STELLA_HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("STELLA_HEDGE_MIN_DELAY_SECONDS", 0.25))
+HEDGE_MAX_WORKERS = int(os.getenv("STELLA_HEDGE_MAX_WORKERS", 16))
+# Nombre de latences récentes conservées par fournisseur pour les percentiles
+LATENCY_WINDOW = int(os.getenv("STELLA_LATENCY_WINDOW", 200))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+
+
+class CircuitOpenError(APILimitError):
+    """Le fournisseur est jugé indisponible : l'appel n'est pas envoyé (disjoncteur ouvert)."""
+    pass
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class ProviderGuard:
+    """
+    Protège les appels vers un fournisseur de données (FMP, Yahoo Finance) :
+    - suit les latences récentes (p50/p95/p99) ;
+    - disjoncteur : après CIRCUIT_FAILURE_THRESHOLD échecs ou délais dépassés consécutifs, les appels
+      échouent immédiatement en CircuitOpenError pendant CIRCUIT_OPEN_SECONDS, puis un seul appel
+      d'essai décide de la fermeture. L'appelant peut alors servir une valeur périmée s'il en a une ;
+    - hedging : si un appel dépasse le p95 observé, une seconde requête identique est envoyée et
+      la première réponse gagne. Seuls ~5 % des appels sont doublés.
+
+    Les ValueError et InvalidRequestError (ticker invalide, réponse vide, requête refusée en 400/404)
+    signifient que le fournisseur a répondu : elles ne comptent pas comme des échecs. Une
+    QuotaExhaustedError (quota local épuisé) signifie qu'aucune requête n'est partie : l'appel
+    n'est compté ni comme un succès ni comme un échec.
+
+    Le hedging suppose que deux appels identiques simultanés sont indépendants (requêtes HTTP) :
+    il faut le désactiver (`hedge=False`) pour les clients à état global comme yfinance.
+    """
+
+    def __init__(self, name: str, hedge: bool = HEDGE_REQUESTS, slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS):
+        self.name = name
+        self.hedge = hedge
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        self._stats = {"calls": 0, "failures": 0, "short_circuited": 0, "hedged": 0, "hedge_wins": 0}
+
+    # --- Disjoncteur ---
+    def _before_call(self) -> bool:
+        """Renvoie True si l'appel est un appel d'essai (demi-ouvert) ; lève CircuitOpenError si le circuit est ouvert."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["short_circuited"] += 1
+            retry_in = max(0.0, CIRCUIT_OPEN_SECONDS - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"{self.name} ne répond plus correctement : appels suspendus (nouvel essai dans {retry_in:.0f}s).")
+
+    def _after_call(self, elapsed: float, failed: bool, trial: bool) -> None:
+        failed = failed or elapsed > self.slow_call_seconds
+        with self._lock:
+            self._stats["calls"] += 1
+            if trial:
+                self._trial_in_flight = False
+            if not failed:
+                self._latencies.append(elapsed)
+                self._consecutive_failures = 0
+                if self._state != CLOSED:
+                    print(f"Disjoncteur '{self.name}': fournisseur rétabli, circuit refermé.")
+                self._state = CLOSED
+                return
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            if trial or self._consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                if self._state != OPEN:
+                    print(f"Disjoncteur '{self.name}': {self._consecutive_failures} échecs consécutifs, circuit ouvert pendant {CIRCUIT_OPEN_SECONDS:.0f}s.")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _cancel_call(self, trial: bool) -> None:
+        """L'appel n'a pas atteint le fournisseur : seul l'appel d'essai éventuel est libéré."""
+        if trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+    # --- Hedging ---
+    def _hedge_delay(self):
+        """Délai avant la requête de secours (le p95 observé), ou None si le hedging ne s'applique pas."""
+        with self._lock:
+            if not self.hedge or len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            p95 = _percentile(sorted(self._latencies), 0.95)
+        return max(p95, HEDGE_MIN_DELAY_SECONDS)
+
+    def _call_hedged(self, fn, delay: float):
+        # Chaque requête s'exécute dans une copie du contexte (voie de priorité du quota, etc.)
+        primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        with self._lock:
+            self._stats["hedged"] += 1
+        print(f"{self.name}: appel plus lent que le p95 ({delay:.2f}s), envoi d'une requête de secours.")
+        secondary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([primary, secondary], return_when=FIRST_COMPLETED)
+        first = done.pop()
+        if first.exception() is None:
+            if first is secondary:
+                with self._lock:
+                    self._stats["hedge_wins"] += 1
+            return first.result()
+        # La première réponse est une erreur : on attend l'autre requête
+        other = secondary if first is primary else primary
+        return other.result()
+
+    # --- API publique ---
+    def call(self, fn):
+        """Exécute `fn()` sous la protection du disjoncteur, avec hedging au-delà du p95."""
+        trial = self._before_call()
+        delay = None if trial else self._hedge_delay()
+        start = time.monotonic()
+        try:
+            result = self._call_hedged(fn, delay) if delay is not None else fn()
+        except QuotaExhaustedError:
+            self._cancel_call(trial)
+            raise
+        except (ValueError, InvalidRequestError):
+            self._after_call(time.monotonic() - start, failed=False, trial=trial)
+            raise
+        except Exception:
+            self._after_call(time.monotonic() - start, failed=True, trial=trial)
+            raise
+        self._after_call(time.monotonic() - start, failed=False, trial=trial)
+        return result
+
+    def stats(self) -> dict:
+        """État du disjoncteur, compteurs et percentiles de latence (secondes)."""
+        with self._lock:
+            stats = {**self._stats, "state": self._state, "consecutive_failures": self._consecutive_failures}
+            latencies = sorted(self._latencies)
+        for label, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            stats[label] = round(_percentile(latencies, q), 4) if latencies else None
+        return stats
+
+
+fmp_guard = ProviderGuard("FMP")
+# yf.download garde ses résultats dans un état global du module (shared._DFS) remis à zéro à chaque
+# appel : deux téléchargements simultanés s'écraseraient, donc pas de requête de secours pour Yahoo.
+yfinance_guard = ProviderGuard("Yahoo Finance", hedge=False, slow_call_seconds=YFINANCE_SLOW_CALL_SECONDS)
@@ -0,0 +1,77 @@
+# src/singleflight.py
+
+import threading
+
+
+class _Call:
+    """Un appel en cours : les appelants suivants attendent `done` puis partagent le résultat."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Regroupe les appels identiques simultanés ("single-flight") : tant qu'un appel pour une clé
+    est en cours, les autres appelants de la même clé attendent son résultat au lieu de relancer
+    la requête. Rien n'est mis en cache : une fois l'appel terminé, le suivant repart en amont.
+
+    Le résultat (ou l'exception) est partagé tel quel entre les appelants : il ne doit pas être modifié.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key: str, fn):
+        """Exécute `fn()` pour `key`, ou attend l'exécution déjà en cours pour cette même clé."""
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["upstream"] += 1
+                leader = True
+
+        if not leader:
+            print(f"SingleFlight '{self.name}': requête '{key}' déjà en cours, on attend son résultat.")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            # Y compris KeyboardInterrupt/SystemExit : les appelants en attente ne doivent pas recevoir None
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """Compteurs : appels reçus, requêtes réellement envoyées en amont, appels regroupés."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["coalesced_rate"] = stats["coalesced"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+
+# Une instance par fournisseur : les clés sont préfixées par l'endpoint
+fmp_flight = SingleFlight("fmp")
+yfinance_flight = SingleFlight("yfinance")
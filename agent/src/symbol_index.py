@@ -0,0 +1,212 @@
+# src/symbol_index.py
+
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from .cache import TTLDiskCache
+from .http_client import HTTP_CONNECT_TIMEOUT, get_json
+from .rate_limit import request_lane, BACKGROUND
+
+FMP_API_KEY = os.getenv("FMP_API_KEY")
+
+SYMBOL_INDEX_ENABLED = os.getenv("STELLA_SYMBOL_INDEX", "1") == "1"
+# La liste complète des symboles FMP change peu : on la retélécharge une fois par semaine
+SYMBOL_INDEX_TTL_SECONDS = float(os.getenv("STELLA_SYMBOL_INDEX_TTL_SECONDS", 7 * 24 * 3600))
+SYMBOL_INDEX_STALE_SECONDS = float(os.getenv("STELLA_SYMBOL_INDEX_STALE_SECONDS", 30 * 24 * 3600))
+# Délai avant une nouvelle tentative si le téléchargement de la liste a échoué
+SYMBOL_INDEX_RETRY_SECONDS = float(os.getenv("STELLA_SYMBOL_INDEX_RETRY_SECONDS", 3600))
+# Score de similarité minimal (Dice sur trigrammes) et écart minimal avec le second nom candidat :
+# en dessous, la recherche est jugée ambiguë et l'API /search prend le relais
+SYMBOL_INDEX_MIN_SCORE = float(os.getenv("STELLA_SYMBOL_INDEX_MIN_SCORE", 0.55))
+SYMBOL_INDEX_MIN_MARGIN = float(os.getenv("STELLA_SYMBOL_INDEX_MIN_MARGIN", 0.1))
+# Nombre de candidats renvoyés (comme la limite de l'endpoint /search), après tri par bourse préférée
+SYMBOL_INDEX_MAX_CANDIDATES = 10
+
+BULK_LIST_URL = "https://financialmodelingprep.com/api/v3/stock/list"
+
+# La liste complète ne donne pas la devise : on la déduit de la bourse pour les règles de préférence
+EXCHANGE_CURRENCIES = {
+    "NYSE": "USD", "NASDAQ": "USD", "AMEX": "USD", "OTC": "USD",
+    "PAR": "EUR", "XETRA": "EUR", "AMS": "EUR", "BRU": "EUR", "MIL": "EUR",
+    "LSE": "GBp", "TSX": "CAD", "KS": "KRW", "KSC": "KRW", "JPX": "JPY", "HKSE": "HKD",
+}
+
+# Formes juridiques et mots vides retirés des noms avant comparaison ("Apple Inc." -> "apple")
+_NAME_STOPWORDS = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc",
+    "sa", "se", "ag", "nv", "spa", "ab", "asa", "oyj", "group", "holding", "holdings", "the",
+}
+
+symbols_cache = TTLDiskCache(
+    "fmp_symbols",
+    ttl_seconds=SYMBOL_INDEX_TTL_SECONDS,
+    stale_seconds=SYMBOL_INDEX_STALE_SECONDS,
+    max_entries=1,
+)
+
+
+def normalize_name(name: str) -> str:
+    """Minuscules, sans accents ni ponctuation, sans forme juridique."""
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    words = re.sub(r"[^a-z0-9]+", " ", name).split()
+    kept = [word for word in words if word not in _NAME_STOPWORDS]
+    return " ".join(kept or words)
+
+def _trigrams(normalized: str) -> set:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolIndex:
+    """
+    Index local de l'univers des symboles FMP (liste complète téléchargée une fois, gardée
+    SYMBOL_INDEX_TTL_SECONDS sur disque), pour résoudre un nom d'entreprise sans appel réseau.
+
+    - Correspondance exacte sur le nom normalisé : un accès dictionnaire.
+    - Sinon, recherche floue par index inversé de trigrammes (score de Dice).
+    L'index est construit en tâche de fond au premier usage ; tant qu'il n'est pas prêt,
+    ou si la recherche est ambiguë, `lookup` renvoie None et l'appelant utilise l'API.
+    """
+
+    def __init__(self, cache: TTLDiskCache = symbols_cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._loading = False
+        self._failed_at = None
+        self._entries = None # Liste de dicts {symbol, name, exchangeShortName, currency}
+        self._by_name = {}
+        self._trigram_index = {}
+        self._trigram_counts = []
+        self._stats = {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0, "ambiguous": 0, "not_ready": 0}
+
+    # --- Construction ---
+    def _download(self) -> list:
+        """Télécharge la liste complète des symboles et n'en garde que les champs utiles."""
+        if not FMP_API_KEY:
+            raise ValueError("La clé API FMP_API_KEY n'est pas configurée.")
+        data = get_json(BULK_LIST_URL, params={'apikey': FMP_API_KEY}, service="la liste des symboles FMP",
+                        timeout=(HTTP_CONNECT_TIMEOUT, 60), provider="fmp")
+        return [[item.get('symbol'), item.get('name'), item.get('exchangeShortName')]
+                for item in data or [] if item.get('symbol') and item.get('name')]
+
+    def _build(self, rows: list) -> None:
+        entries, by_name = [], defaultdict(list)
+        trigram_index, trigram_counts = defaultdict(list), []
+        for symbol, name, exchange in rows:
+            normalized = normalize_name(name)
+            if not normalized:
+                continue
+            position = len(entries)
+            entries.append({"symbol": symbol, "name": name, "exchangeShortName": exchange,
+                            "currency": EXCHANGE_CURRENCIES.get(exchange)})
+            by_name[normalized].append(position)
+            grams = _trigrams(normalized)
+            trigram_counts.append(len(grams))
+            for gram in grams:
+                trigram_index[gram].append(position)
+        with self._lock:
+            self._entries, self._by_name = entries, dict(by_name)
+            self._trigram_index, self._trigram_counts = dict(trigram_index), trigram_counts
+
+    def _load(self) -> None:
+        start = time.perf_counter()
+        try:
+            self._build(self.cache.get_or_fetch("stock_list", self._download))
+            print(f"Index des symboles prêt : {len(self._entries)} symboles en {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            self._failed_at = time.time()
+            print(f"Index des symboles indisponible, la recherche passera par l'API : {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+    def _load_in_background(self) -> None:
+        # Le téléchargement de la liste passe après les requêtes des sessions
+        with request_lane(BACKGROUND):
+            self._load()
+
+    def ensure_loaded(self, background: bool = True) -> bool:
+        """Lance la construction de l'index si besoin ; renvoie True si l'index est prêt."""
+        with self._lock:
+            if self._entries is not None:
+                return True
+            if self._loading or (self._failed_at and time.time() - self._failed_at < SYMBOL_INDEX_RETRY_SECONDS):
+                return False
+            self._loading = True
+        if background:
+            threading.Thread(target=self._load_in_background, name="symbol-index-load", daemon=True).start()
+            return False
+        self._load()
+        return self._entries is not None
+
+    # --- Recherche ---
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _candidates(self, positions: list) -> list:
+        """
+        Cotations d'un même nom, les bourses et devise préférées de `_select_best_ticker` en tête
+        (l'ordre de la liste FMP est conservé à préférence égale), tronquées à SYMBOL_INDEX_MAX_CANDIDATES.
+        """
+        # Import local : search_ticker importe ce module
+        from .search_ticker import PREFERRED_EXCHANGES, PREFERRED_CURRENCY
+        def preference(entry: dict) -> int:
+            if entry["exchangeShortName"] not in PREFERRED_EXCHANGES:
+                return 2
+            return 0 if entry["currency"] == PREFERRED_CURRENCY else 1
+        entries = sorted((self._entries[p] for p in positions), key=preference)
+        return entries[:SYMBOL_INDEX_MAX_CANDIDATES]
+
+    def _fuzzy(self, normalized: str) -> list:
+        """Renvoie [(score, position)] triés par score décroissant."""
+        grams = _trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigram_index.get(gram, ()))
+        scored = [(2 * count / (len(grams) + self._trigram_counts[position]), position) for position, count in shared.items()]
+        scored.sort(key=lambda item: -item[0])
+        return scored
+
+    def lookup(self, company_name: str):
+        """
+        Renvoie la liste des candidats (format proche de /search) pour un nom d'entreprise,
+        ou None si l'index n'est pas prêt, si rien ne correspond ou si la correspondance est ambiguë.
+        """
+        if not SYMBOL_INDEX_ENABLED or not self.ensure_loaded():
+            self._count("not_ready")
+            return None
+        normalized = normalize_name(company_name)
+        if not normalized:
+            return None
+
+        positions = self._by_name.get(normalized)
+        if positions:
+            self._count("exact_hits")
+            return self._candidates(positions)
+
+        scored = self._fuzzy(normalized)
+        if not scored or scored[0][0] < SYMBOL_INDEX_MIN_SCORE:
+            self._count("misses")
+            return None
+        best_score, best_position = scored[0]
+        best_name = normalize_name(self._entries[best_position]["name"])
+        # Les cotations multiples d'une même société partagent le nom : seul un autre nom compte comme rival
+        runner_up = next((score for score, p in scored[1:] if normalize_name(self._entries[p]["name"]) != best_name), 0.0)
+        if best_score - runner_up < SYMBOL_INDEX_MIN_MARGIN:
+            self._count("ambiguous")
+            return None
+        self._count("fuzzy_hits")
+        return self._candidates(self._by_name[best_name])
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["symbols"] = len(self._entries) if self._entries is not None else 0
+        return stats
+
+
+symbol_index = SymbolIndex()
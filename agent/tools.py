@@ -1,8 +1,6 @@
 # tools.py
 
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
 from langchain_core.tools import tool
 from io import StringIO
 from typing import List
@@ -18,6 +16,7 @@ from src.fetch_price import fetch_price_history as _fetch_price_history_logic
 from src.compare_fundamentals import compare_fundamental_metrics as _compare_fundamental_metrics_logic
 from src.compare_prices import compare_price_histories as _compare_price_histories_logic
 from src.chart_theme import stella_theme
+from src.figure_codec import encode_figure
 
 
 # --- Définition des outils ---
@@ -40,6 +39,19 @@ def fetch_data(ticker: str) -> str:
     """Récupère les données financières fondamentales pour un ticker boursier donné."""
     return f"[Les données pour {ticker} sont prêtes à être récupérées par le système.]"
 
+@tool
+def full_analysis(ticker: str = None, company_name: str = None) -> str:
+    """
+    Lance en UN SEUL appel l'analyse complète d'une action américaine : recherche du ticker si besoin,
+    récupération des données fondamentales, prétraitement et analyse des risques.
+    C'est l'outil à utiliser dès que l'utilisateur demande une "analyse complète" d'une entreprise.
+
+    Args:
+        ticker (str, optional): Le ticker de l'action (ex: 'AAPL'), s'il est connu.
+        company_name (str, optional): Le nom de l'entreprise (ex: 'Apple'), si le ticker n'est pas connu.
+    """
+    return "[L'analyse complète est prête à être exécutée par le système.]"
+
 @tool
 def preprocess_data() -> str:
     """Prépare les données financières récupérées pour la prédiction."""
@@ -71,6 +83,8 @@ def _create_dynamic_chart_logic(
     color_column: str = None
 ) -> str:
     """Contient la logique de création de graphique, sans être un outil LangChain."""
+    # Import à la première utilisation : plotly est lourd et inutile au démarrage
+    import plotly.express as px
     try:
         df = data.copy() # On travaille sur une copie
         if 'calendarYear' in df.columns:
@@ -94,7 +108,7 @@ def _create_dynamic_chart_logic(
             return f"Erreur : Le type de graphique '{chart_type}' n'est pas supporté."
 
         fig.update_layout(template="plotly_white", font=dict(family="Arial, sans-serif"))
-        return pio.to_json(fig)
+        return encode_figure(fig)
 
     except Exception as e:
         # Il est utile de savoir quelle colonne a posé problème
@@ -180,6 +194,7 @@ def compare_stocks(tickers: List[str], metric: str, comparison_type: str = 'fund
 # --- La liste complète des outils disponibles pour l'agent ---
 available_tools = [
     search_ticker,
+    full_analysis,
     fetch_data,
     get_stock_news,
     get_company_profile,
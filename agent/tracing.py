@@ -0,0 +1,130 @@
+# tracing.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Nombre de sessions dont la trace est gardée en mémoire (éviction LRU au-delà)
+TRACE_MAX_THREADS = int(os.getenv("STELLA_TRACE_MAX_THREADS", 200))
+# Nombre d'exécutions (tours) conservées par session
+TRACE_MAX_RUNS_PER_THREAD = int(os.getenv("STELLA_TRACE_MAX_RUNS_PER_THREAD", 5))
+
+
+class TraceStore:
+    """
+    Stockage en mémoire, borné, des traces d'exécution du graphe, par session (thread_id).
+
+    Une trace est la liste ordonnée des noeuds traversés pendant un tour, avec leurs
+    horodatages, leur durée, les appels d'outils demandés et l'éventuelle erreur.
+    """
+
+    def __init__(self, max_threads: int = TRACE_MAX_THREADS, max_runs_per_thread: int = TRACE_MAX_RUNS_PER_THREAD):
+        self.max_threads = max_threads
+        self.max_runs_per_thread = max_runs_per_thread
+        self._threads = OrderedDict() # thread_id -> OrderedDict(run_id -> run)
+        self._lock = threading.Lock()
+
+    def start_run(self, thread_id: str, run_id: str) -> None:
+        with self._lock:
+            runs = self._threads.setdefault(thread_id, OrderedDict())
+            self._threads.move_to_end(thread_id)
+            runs[run_id] = {"run_id": run_id, "started_at": time.time(), "ended_at": None, "error": None, "steps": []}
+            while len(runs) > self.max_runs_per_thread:
+                runs.popitem(last=False)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def end_run(self, thread_id: str, run_id: str, error: str = None) -> None:
+        with self._lock:
+            run = self._threads.get(thread_id, {}).get(run_id)
+            if run is not None:
+                run["ended_at"] = time.time()
+                run["error"] = error
+
+    def start_step(self, thread_id: str, run_id: str, step_id: str, node: str, tool_calls: list) -> None:
+        with self._lock:
+            run = self._threads.get(thread_id, {}).get(run_id)
+            if run is not None:
+                run["steps"].append({
+                    "step_id": step_id, "node": node, "started_at": time.time(),
+                    "ended_at": None, "duration": None, "tool_calls": tool_calls, "error": None,
+                })
+
+    def end_step(self, thread_id: str, run_id: str, step_id: str, error: str = None) -> None:
+        with self._lock:
+            run = self._threads.get(thread_id, {}).get(run_id)
+            if run is None:
+                return
+            for step in reversed(run["steps"]):
+                if step["step_id"] == step_id:
+                    step["ended_at"] = time.time()
+                    step["duration"] = step["ended_at"] - step["started_at"]
+                    step["error"] = error
+                    return
+
+    def last_run(self, thread_id: str):
+        """Renvoie une copie de la dernière exécution enregistrée pour la session, ou None."""
+        with self._lock:
+            runs = self._threads.get(thread_id)
+            if not runs:
+                return None
+            run = next(reversed(runs.values()))
+            return {**run, "steps": [dict(step) for step in run["steps"]]}
+
+    def drop_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+trace_store = TraceStore()
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """
+    Callback LangChain qui enregistre, pour une session, l'entrée et la sortie de chaque noeud
+    du graphe dans le TraceStore. À passer dans la config d'exécution :
+    app.stream(inputs, config={"configurable": {...}, "callbacks": [TraceRecorder(thread_id)]})
+    """
+
+    def __init__(self, thread_id: str, store: TraceStore = trace_store):
+        self.thread_id = str(thread_id)
+        self.store = store
+        self._root_run_id = None
+
+    @staticmethod
+    def _pending_tool_calls(inputs) -> list:
+        """Appels d'outils du dernier AIMessage de l'état reçu par le noeud."""
+        messages = inputs.get("messages") if isinstance(inputs, dict) else None
+        for message in reversed(messages or []):
+            tool_calls = getattr(message, "tool_calls", None)
+            if tool_calls:
+                return [{"name": call["name"], "args": call["args"]} for call in tool_calls]
+        return []
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        if parent_run_id is None:
+            self._root_run_id = str(run_id)
+            self.store.start_run(self.thread_id, self._root_run_id)
+            return
+        # Seuls les enfants directs du graphe sont des noeuds (les appels LLM, routeurs... sont plus profonds)
+        if str(parent_run_id) != self._root_run_id:
+            return
+        node = kwargs.get("name") or (metadata or {}).get("langgraph_node")
+        if not node or node.startswith("__"):
+            return
+        tool_calls = self._pending_tool_calls(inputs) if node == "execute_tool" else []
+        self.store.start_step(self.thread_id, self._root_run_id, str(run_id), node, tool_calls)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if str(run_id) == self._root_run_id:
+            self.store.end_run(self.thread_id, self._root_run_id)
+        elif parent_run_id is not None and str(parent_run_id) == self._root_run_id:
+            self.store.end_step(self.thread_id, self._root_run_id, str(run_id))
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if str(run_id) == self._root_run_id:
+            self.store.end_run(self.thread_id, self._root_run_id, error=str(error))
+        elif parent_run_id is not None and str(parent_run_id) == self._root_run_id:
+            self.store.end_step(self.thread_id, self._root_run_id, str(run_id), error=str(error))